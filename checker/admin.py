@@ -3,13 +3,50 @@ from __future__ import unicode_literals
 
 from django.contrib import admin
 
-from .models import Exclude, Keyword, Repository, Issue, Failure
+from .models import Exclude, Keyword, Repository, Issue, Failure, BranchHead, RepositoryPush, Run, \
+    RepositoryLease, PushedCommit, PathFilter, Notification
+
+
+class ExcludeAdmin(admin.ModelAdmin):
+    list_display = ("repository", "branch", "match")
+
+
+class PathFilterAdmin(admin.ModelAdmin):
+    list_display = ("pattern", "action", "match")
 
 
 class RepositoryAdmin(admin.ModelAdmin):
     list_display = ("repository", "commit")
 
 
+class BranchHeadAdmin(admin.ModelAdmin):
+    list_display = ("repository", "branch", "commit", "checked")
+
+
+class RepositoryPushAdmin(admin.ModelAdmin):
+    list_display = ("repository", "pushed_at")
+
+
+class FailureAdmin(admin.ModelAdmin):
+    list_display = ("repository", "branch", "commit", "attempts", "next_retry")
+
+
+class RunAdmin(admin.ModelAdmin):
+    list_display = ("id", "shard", "started", "finished")
+
+
+class RepositoryLeaseAdmin(admin.ModelAdmin):
+    list_display = ("repository", "owner", "expires")
+
+
+class PushedCommitAdmin(admin.ModelAdmin):
+    list_display = ("repository", "branch", "commit", "received", "scanned")
+
+
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("author_email", "issue", "attempts", "next_attempt", "last_error")
+
+
 class IssueAdmin(admin.ModelAdmin):
     list_display = ("repository", "commit_hash", "status",
                     "author", "display_issue_url")
@@ -23,8 +60,15 @@ class IssueAdmin(admin.ModelAdmin):
     display_issue_url.allow_tags = True
 
 
-admin.site.register(Exclude)
+admin.site.register(Exclude, ExcludeAdmin)
 admin.site.register(Keyword)
-admin.site.register(Failure)
+admin.site.register(PathFilter, PathFilterAdmin)
+admin.site.register(Failure, FailureAdmin)
 admin.site.register(Repository, RepositoryAdmin)
 admin.site.register(Issue, IssueAdmin)
+admin.site.register(BranchHead, BranchHeadAdmin)
+admin.site.register(RepositoryPush, RepositoryPushAdmin)
+admin.site.register(Run, RunAdmin)
+admin.site.register(RepositoryLease, RepositoryLeaseAdmin)
+admin.site.register(PushedCommit, PushedCommitAdmin)
+admin.site.register(Notification, NotificationAdmin)
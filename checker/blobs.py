@@ -0,0 +1,125 @@
+import codecs
+
+import requests
+
+from .patch import scan_chunks
+
+
+# like git, a file with a NUL byte near the start is taken to be binary
+BINARY_CHECK_SIZE = 8000
+
+# not worth downloading to find out
+BINARY_EXTENSIONS = frozenset([
+    "png", "jpg", "jpeg", "gif", "ico", "bmp", "webp", "psd", "pdf", "zip", "gz", "tgz",
+    "bz2", "xz", "7z", "jar", "war", "whl", "egg", "woff", "woff2", "ttf", "otf", "eot",
+    "mp3", "mp4", "mov", "avi", "wav", "exe", "dll", "so", "dylib", "pyc", "class",
+])
+
+
+def is_binary(data):
+    return b"\0" in data[:BINARY_CHECK_SIZE]
+
+
+def decode_chunks(chunks):
+    """
+    Decode UTF-8 byte chunks, a character split across two chunks included.
+    """
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+
+        if text:
+            yield text
+
+    text = decoder.decode(b"", final=True)
+
+    if text:
+        yield text
+
+
+class BlobScanner(object):
+    """
+    Scan the full contents of the files GitHub lists without a patch, which
+    it does for new or changed files whose diff is too big to include.
+
+    The raw content is streamed from the file's raw_url a chunk at a time and
+    scanned as it arrives, so only a chunk and a partial line are held in
+    memory.  Every line of the file is scanned, since without the diff the
+    changed lines can't be told apart.  Binary files are skipped after their
+    first chunk, and files are only read up to max_size bytes.
+    """
+
+    def __init__(self, token, chunk_size, overlap, max_size, session=None):
+        self.token = token
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.max_size = max_size
+        self.session = session or requests.Session()
+
+    def wants(self, file_):
+        """
+        Return whether a file from a GitHub commit's files list should have
+        its content scanned.  Files the commit added no lines to, such as
+        renames and mode changes, are skipped, their content isn't new.
+        """
+
+        if file_.get("additions") == 0 or file_.get("changes") == 0:
+            return False
+
+        extension = file_["filename"].rsplit(".", 1)[-1].lower()
+
+        return "patch" not in file_ and file_.get("status") != "removed" and \
+            bool(file_.get("raw_url")) and extension not in BINARY_EXTENSIONS
+
+    def chunks(self, file_):
+        """
+        Yield the file's raw content a chunk at a time, stopping at max_size,
+        or nothing if it is binary.
+        """
+
+        response = self.session.get(
+            file_["raw_url"], stream=True,
+            headers={"Authorization": "token {}".format(self.token)})
+
+        try:
+            response.raise_for_status()
+            size = 0
+
+            for chunk in response.iter_content(self.chunk_size):
+                if size == 0 and is_binary(chunk):
+                    return
+
+                yield chunk
+                size += len(chunk)
+
+                if size >= self.max_size:
+                    return
+        finally:
+            response.close()
+
+    def scan(self, file_, keywords):
+        """
+        Return (keyword, line number) for each keyword in the file's content.
+        """
+
+        return scan_chunks(
+            decode_chunks(self.chunks(file_)), keywords,
+            max_line=self.chunk_size, overlap=self.overlap)
+
+    def scan_cached(self, file_, keywords, cache=None):
+        """
+        Like scan, but remembering the matches in cache by the file's blob.
+        """
+
+        key = "blob {}".format(file_.get("sha"))
+        found = cache.get(key) if cache and file_.get("sha") else None
+
+        if found is None:
+            found = self.scan(file_, keywords)
+
+            if cache and file_.get("sha"):
+                cache.set(key, found)
+
+        return found
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from .diskcache import DiskStore
+
+
+class ScanCache(object):
+    """
+    Remember the matches found in a patch, keyed by a hash of the patch and
+    the version of the keyword set it was scanned with.
+
+    Recently used results are kept in memory, evicting the least recently
+    used once they take more than max_bytes, with an optional on-disk tier
+    at path holding up to disk_bytes.  An entry's size is taken as the length
+    of its key and its matches as JSON.  Changing the keywords changes the
+    version, so earlier results are never returned for a different keyword
+    set, and are left to be evicted.
+    """
+
+    def __init__(self, version, max_bytes, path=None, disk_bytes=None):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk = DiskStore(path, disk_bytes or max_bytes) if path else None
+
+    def key(self, patch):
+        digest = hashlib.sha1(self.version.encode("utf-8"))
+        digest.update(patch.encode("utf-8", "surrogatepass"))
+
+        return digest.hexdigest()
+
+    def get(self, patch):
+        """
+        Return the cached matches for patch, or None.
+        """
+
+        key = self.key(patch)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            matches = entry[0] if entry else None
+
+            if matches is None and self._disk is not None:
+                value = self._disk.get(key)
+
+                if value is not None:
+                    matches = [tuple(m) for m in json.loads(value)]
+                    self._store(key, matches, len(key) + len(value))
+
+            if matches is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+
+        return matches
+
+    def set(self, patch, matches):
+        key = self.key(patch)
+        value = json.dumps(matches)
+
+        with self._lock:
+            self._store(key, matches, len(key) + len(value))
+
+            if self._disk is not None:
+                self._disk.set(key, value)
+
+    def _store(self, key, matches, size):
+        if key in self._entries:
+            self._size -= self._entries.pop(key)[1]
+
+        self._entries[key] = (matches, size)
+        self._size += size
+
+        while self._size > self.max_bytes and self._entries:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= evicted
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
@@ -1,43 +1,123 @@
-import re
+from collections import Counter
+import calendar
+import datetime
 import sys
-from ssl import SSLError
 import time
+import zlib
+from ssl import SSLError
 
 from django.conf import settings
+from django.db import transaction
 
 from github import Github
 from github.GithubException import GithubException
-from .models import Exclude, Repository, Keyword, Issue, Failure
+from .models import Exclude, Repository, Keyword, Issue, Failure, BranchHead, RepositoryPush, Run, \
+    RepositoryLease, PathFilter, PushedCommit
+from .matcher import KeywordMatcher, get_matcher
+from .members import OrgMembers
+from .patch import scan_patch
+from .mirror import MirrorSource
+from .notifications import send_queued_notifications
+from .blobs import BlobScanner
+from .cache import ScanCache
+from .graphql import GraphQLDiscovery
+from .httpcache import ConditionalRequestCache, install
+from .checkpoint import Checkpoint
+from .parallel import ParallelScanner
+from .pipeline import Pipeline
+from .store import PatchStore, StoredCommit
+from .throttle import Throttle
+
+
+# the compare API lists at most this many files, anything more is dropped
+COMPARE_MAX_FILES = 300
 
 
-KEYWORD_SEARCH_REGEX = "[^\w]{{1}}{keyword}[^\w]{{1}}"
+_http_cache = None
+
+
+def get_client():
+    """
+    Return a GitHub client, sending its requests through the conditional
+    request cache
+    """
+
+    global _http_cache
+
+    if _http_cache is None:
+        _http_cache = ConditionalRequestCache(
+            settings.CHECKER_HTTP_CACHE_ENTRIES, path=settings.CHECKER_HTTP_CACHE_PATH,
+            max_bytes=settings.CHECKER_HTTP_CACHE_BYTES)
+        install(_http_cache)
+
+    return Github(settings.GITHUB_ACCESS_TOKEN)
 
 
 def get_branches(repo):
     """
-    return the tuple with the default branch and other branches
+    return the repository's branches, default branch first
     """
 
-    return [repo.default_branch] + [r.name for r in repo.get_branches() if r.name != repo.default_branch]
+    return sorted(repo.get_branches(), key=lambda b: b.name != repo.default_branch)
 
-def get_org_users(client):
 
-    org = client.get_organization(settings.GITHUB_ORGANISATION)
+def get_org_users():
+    """
+    Return the organisation's member logins, cached in the database
+    """
 
-    return [m.login for m in org.get_members()]
+    return OrgMembers(
+        settings.GITHUB_ACCESS_TOKEN, settings.GITHUB_ORGANISATION,
+        datetime.timedelta(seconds=settings.CHECKER_ORG_MEMBERS_TTL))
 
 
-def get_respositories(client):
+def in_shard(name, shard):
     """
-    Return a list of all public repos not including excluded repos
+    Return whether repository name belongs to shard, an (index, count) pair
     """
 
-    org = client.get_organization(settings.GITHUB_ORGANISATION)
+    index, count = shard
+
+    return zlib.crc32(name.encode("utf-8")) % count == index
 
-    exclude_list = [er.repository for er in Exclude.objects.all()]
 
-    for repo in org.get_repos():
-        if not repo.private and repo.name not in exclude_list:
+def parse_shard(value):
+    """
+    Parse an "i/N" shard argument into an (index, count) pair
+    """
+
+    index, count = (int(n) for n in value.split("/"))
+
+    if not 0 <= index < count:
+        raise ValueError("shard index must be between 0 and N - 1")
+
+    return index, count
+
+
+def get_shard_label(shard):
+    return "{}/{}".format(*shard) if shard else ""
+
+
+def get_respositories(client, shard=None, throttle=None):
+    """
+    Return a list of all public repos not including excluded repos, limited
+    to the shard's repos if given
+    """
+
+    if settings.CHECKER_DISCOVERY == "graphql":
+        repos = GraphQLDiscovery(
+            client, settings.GITHUB_ACCESS_TOKEN, settings.GITHUB_ORGANISATION,
+            throttle=throttle).repositories()
+    else:
+        repos = client.get_organization(settings.GITHUB_ORGANISATION).get_repos()
+
+    excludes = Exclude.objects.rules()
+
+    for repo in repos:
+        if shard and not in_shard(repo.name, shard):
+            continue
+
+        if not repo.private and not excludes.excludes(repo.name):
             yield repo
 
 
@@ -50,21 +130,69 @@ def get_commits(repository, branch):
         return
 
 
-def scan_files(commit, keywords):
+class ApiSource(object):
+    """
+    Read branches and commits from the GitHub API.
+    """
+
+    can_compare = True
+
+    def __init__(self, throttle):
+        self.throttle = throttle
+
+    def branches(self, repo):
+        return [(b.name, b.commit.sha) for b in get_branches(repo)]
+
+    def commits(self, repo, branch, start=None):
+        return get_commits(repo, start or branch)
+
+    def fetch(self, commit):
+        """
+        Load the commit's files from the API.
+        """
+
+        self.throttle.call(lambda: commit.raw_data["files"])
+
+        return commit
+
+    def issue_commit(self, repo, commit):
+        return commit
+
+
+def scan_files(commit, keywords, cache=None, file_filter=None, blobs=None):
+    """
+    Return (filename, keyword, line number) for each keyword found on a line
+    the commit adds.  Patches already in cache are not scanned again, and
+    files file_filter skips are not scanned at all.
+
+    Files listed without a patch, binary files and files whose diff is too
+    big for GitHub to include, have their whole content scanned by blobs.
+    """
+
     matches = []
     for file_ in commit.raw_data["files"]:
         if "patch" not in file_:
-            # Assume a lack of a patch field indicates a binary file?
-            # It could also mean a new file?  Need to verify this.
+            if blobs and blobs.wants(file_) and not (
+                    file_filter and file_filter.skip(file_["filename"])):
+                for keyword, line_number in blobs.scan_cached(file_, keywords, cache):
+                    matches.append((file_["filename"], keyword, line_number))
+
             continue
 
-        found_keywords = search_text(file_["patch"], keywords)
+        if file_filter and file_filter.skip(
+                file_["filename"], file_.get("changes"), file_["patch"]):
+            continue
+
+        found = cache.get(file_["patch"]) if cache else None
+
+        if found is None:
+            found = scan_patch(file_["patch"], keywords)
 
-        if found_keywords:
-            matches.append((
-                file_["filename"],
-                found_keywords,
-            ))
+            if cache:
+                cache.set(file_["patch"], found)
+
+        for keyword, line_number in found:
+            matches.append((file_["filename"], keyword, line_number))
 
     return matches
 
@@ -84,61 +212,607 @@ def process_patch(patch):
 def search_text(text, keywords):
     """
     Search text for keywords.
+
+    keywords is either a KeywordMatcher or a list of keywords, in which case
+    the matcher is compiled (and cached) for that list.
     """
-    text = text.lower()
-    found = []
 
-    for keyword in keywords:
-        # NOTE: python maintains a regex cache, so re.compile is not strictly necessary
-        # (unless we're using
-        regex = KEYWORD_SEARCH_REGEX.format(keyword=keyword)
+    if not isinstance(keywords, KeywordMatcher):
+        keywords = get_matcher(keywords)
 
-        if re.search(regex, text, re.I):
-            found.append(keyword)
+    return keywords.search(text)
 
-    return found
 
+def get_keywords():
+    """
+    Return a matcher for the current keyword set, only rebuilt when the
+    keywords have changed since the last call.
+    """
 
-def run_check(logger):
+    return get_matcher(Keyword.objects.order_by("id").values_list("text", flat=True))
 
-    keywords = [k.text for k in Keyword.objects.all()]
 
-    gh = Github(settings.GITHUB_ACCESS_TOKEN)
+class CheckRun(object):
+    """
+    A single sweep over every repository, branch and new commit.
+    """
 
-    org_users = get_org_users(gh)
+    def __init__(self, logger, sequential=None, shard=None, label=None):
+        self.logger = logger
+        self.shard = shard
+        self.worker_id = settings.CHECKER_WORKER_ID
+        self.lease_duration = datetime.timedelta(seconds=settings.CHECKER_LEASE_SECONDS)
+        self._lease_renewed = 0
+
+        if sequential is None:
+            sequential = not settings.CHECKER_PIPELINE
+
+        self.sequential = sequential
+        self.keywords = get_keywords()
+        self.client = get_client()
+        self.http_stats = Counter(_http_cache.stats)
+        self.throttle = Throttle(
+            self.client,
+            min_interval=settings.GITHUB_QUERY_SLEEP_TIME,
+            reserve=settings.GITHUB_RATE_LIMIT_RESERVE)
+        self.org_users = get_org_users()
+
+        self.cache = ScanCache(
+            self.keywords.version, settings.CHECKER_SCAN_CACHE_BYTES,
+            path=settings.CHECKER_SCAN_CACHE_PATH,
+            disk_bytes=settings.CHECKER_SCAN_CACHE_DISK_BYTES)
+        self.store = get_patch_store()
+        self.scanner = None
+
+        if settings.CHECKER_SCAN_PROCESSES:
+            self.scanner = ParallelScanner(
+                self.keywords, settings.CHECKER_SCAN_PROCESSES,
+                settings.CHECKER_SCAN_CHUNK_SIZE)
+
+        if settings.CHECKER_SOURCE == "mirror":
+            self.source = MirrorSource(settings.CHECKER_MIRROR_DIR, self.throttle)
+        else:
+            self.source = ApiSource(self.throttle)
+        self.run_state = Run.objects.resume_or_start(
+            datetime.timedelta(hours=settings.CHECKER_RESUME_HOURS),
+            shard=label if label is not None else get_shard_label(shard))
+        self.completed_repositories = self.run_state.completed_repositories()
+        self.checkpoint = Checkpoint(
+            size=settings.CHECKER_CHECKPOINT_SIZE,
+            interval=settings.CHECKER_CHECKPOINT_INTERVAL,
+            run=self.run_state)
+        # (branch, head) of the branch being checked, so its cursor follows
+        # the commits recorded
+        self.branch = None
+        self.pushed_at = RepositoryPush.objects.pushed_at()
+        self.excludes = Exclude.objects.rules()
+        self.file_filter = PathFilter.objects.file_filter()
+        self.blobs = get_blob_scanner()
+        # every commit scanned during this run, across all repositories, so a
+        # commit shared with a fork is only downloaded and scanned once
+        self.seen_commits = set()
+        self.stats = Counter()
+
+    def run(self):
+        if self.completed_repositories:
+            self.logger.info("Resuming run {} started {}, {} repositories already checked".format(
+                self.run_state.id, self.run_state.started, len(self.completed_repositories)))
+
+        try:
+            for repo in get_respositories(self.client, self.shard, self.throttle):
+                if repo.name in self.completed_repositories:
+                    self.stats["repositories already checked this run"] += 1
+                    continue
+
+                self.check(repo)
+        finally:
+            self.close()
+
+        self.run_state.finish()
+        self.report()
+
+    def check(self, repo):
+        """
+        Check a repository unless another worker holds its lease.
+        """
+
+        if not self.renew_lease(repo, force=True):
+            self.logger.info("Skipping {}, another worker is checking it".format(repo.name))
+            self.stats["repositories leased by another worker"] += 1
+            return
+
+        try:
+            self.check_repository(repo)
+        finally:
+            # make everything recorded durable before another worker
+            # can take the repository
+            self.checkpoint.flush()
+            RepositoryLease.objects.release(repo.name, self.worker_id)
+
+    def close(self):
+        self.checkpoint.flush()
+
+        if self.scanner:
+            self.scanner.close()
+
+        self.cache.close()
+
+        if self.store:
+            self.store.close()
+
+    def report(self):
+        self.stats["failures awaiting retry"] = Failure.objects.pending().count()
+        self.stats["scan cache hits"] = self.cache.hits
+        self.stats["scan cache misses"] = self.cache.misses
+
+        self.stats.update(self.file_filter.stats)
+
+        for name, value in self.org_users.report():
+            self.stats[name] = value
+
+        for name, value in (_http_cache.stats - self.http_stats).items():
+            self.stats["API responses cached {}".format(name)] = value
+
+        self.logger.info("Run summary: {}".format(
+            ", ".join("{} {}".format(v, k) for k, v in sorted(self.stats.items()))))
+
+        for reset, used, limit in self.throttle.report():
+            self.logger.info("Used {} of {} API requests in window resetting at {}".format(
+                used, limit, datetime.datetime.utcfromtimestamp(reset)))
+
+    def renew_lease(self, repo, force=False):
+        """
+        Take or renew this worker's lease on repo, at most every third of the
+        lease duration unless forced.  Returns False if the lease was lost.
+        """
+
+        now = time.time()
+
+        if not force and now - self._lease_renewed < self.lease_duration.total_seconds() / 3:
+            return True
+
+        self._lease_renewed = now
+
+        return RepositoryLease.objects.acquire(repo.name, self.worker_id, self.lease_duration)
+
+    def check_repository(self, repo):
+        pushed_at = self.pushed_at.get(repo.name)
+
+        if pushed_at and repo.pushed_at and repo.pushed_at <= pushed_at:
+            self.logger.info("Skipping {}, nothing pushed since {}".format(repo.name, pushed_at))
+            self.stats["repositories unchanged"] += 1
+            return
+
+        # loaded once per repository so the commit loop never has to ask the
+        # database whether a commit has been scanned
+        self.scanned_commits = Repository.objects.scanned_commits(repo.name)
+        self.pushed_commits = PushedCommit.objects.scanned_commits(repo.name)
+        self.failed_commits = set(
+            Failure.objects.filter(repository=repo.name).values_list("commit", flat=True))
+        heads = BranchHead.objects.heads(repo.name)
+        cursors = self.run_state.cursors(repo.name)
+        complete = True
+
+        for branch, head in self.source.branches(repo):
+            # (head, start) the branch's commits are listed from, in turn
+            passes = [(head, None)]
+
+            if self.excludes.excludes_branch(repo.name, branch):
+                self.stats["branches excluded"] += 1
+                continue
+
+            if branch in cursors:
+                # a previous attempt at this run stopped part way through the
+                # branch, carry on from the last commit it recorded, then
+                # check anything pushed since from the current head
+                cursor_head, start = cursors[branch]
+                self.logger.info("Resuming {} branch {} from {}".format(repo.name, branch, start))
+                passes = [(cursor_head, start)] + ([(head, None)] if cursor_head != head else [])
+            elif heads.get(branch) == head:
+                self.stats["branches unchanged"] += 1
+                continue
+
+            if not self.renew_lease(repo):
+                # another worker has taken over, leave the repository for it
+                self.logger.error("Lost the lease on {}".format(repo.name))
+                self.stats["repositories leased by another worker"] += 1
+                return
 
-    for repo in get_respositories(gh):
+            self.logger.info("Checking {} branch {}".format(repo.name, branch))
 
-        for branch in get_branches(repo):
+            for pass_head, start in passes:
+                self.branch = (branch, pass_head)
+                failures = None
 
-            logger.info("Checking {} branch {}".format(repo.name, branch))
+                try:
+                    if settings.CHECKER_COMPARE and self.source.can_compare and \
+                            branch in heads and branch not in cursors:
+                        failures = self.check_branch_compare(repo, branch, heads[branch], head)
+
+                    if failures is None and self.sequential:
+                        failures = self.check_branch(repo, branch, start)
+                    elif failures is None:
+                        failures = self.check_branch_pipelined(repo, branch, start)
+                except KeyboardInterrupt:
+                    sys.exit()
+                except Exception:
+                    # the commits couldn't be listed, leave the branch to be
+                    # listed again from its last recorded head
+                    self.logger.exception("Couldn't list {} branch {}".format(repo.name, branch))
+                    self.stats["branches that couldn't be listed"] += 1
+                    failures = 1
+
+                if failures:
+                    break
+
+            self.branch = None
+
+            if failures:
+                complete = False
+            else:
+                self.checkpoint.set_head(repo.name, branch, head)
+
+        self.stats["repositories checked"] += 1
+        self.checkpoint.set_completed(repo.name)
+
+        if complete and repo.pushed_at:
+            self.pushed_at[repo.name] = repo.pushed_at
+            self.checkpoint.set_pushed_at(repo.name, repo.pushed_at)
+
+    def new_commits(self, repo, branch, start=None):
+        """
+        Yield the branch's commits, newest first, up to the first one that
+        has already been scanned.  Commits already scanned in another
+        repository during this run, or by the push worker, are marked
+        without being yielded.
+
+        If start is given the commits are listed from start, the last commit
+        recorded before the run was interrupted, instead of the branch head.
+        """
+
+        for commit in self.source.commits(repo, branch, start):
+            if commit.sha == start:
+                continue
+
+            if commit.sha in self.scanned_commits:
+                # we've already scanned this far, assume older
+                # commits have already been scanned
+                break
+
+            if commit.sha in self.seen_commits:
+                self.mark_scanned(repo, commit.sha)
+                self.stats["commits already seen this run"] += 1
+                continue
+
+            if commit.sha in self.pushed_commits:
+                self.mark_scanned(repo, commit.sha)
+                self.stats["commits already scanned from pushes"] += 1
+                continue
+
+            yield commit
 
-            for commit in get_commits(repo, branch):
+    def mark_scanned(self, repo, sha, flush=False):
+        branch, head = self.branch or (None, None)
+
+        self.scanned_commits.add(sha)
+        self.seen_commits.add(sha)
+        # keep the lease through long branches, losing it is noticed at the next branch
+        self.renew_lease(repo)
+        self.checkpoint.add(repo.name, sha, flush=flush, branch=branch, head=head)
+
+    def scan_commit(self, commit):
+        self.logger.info("Checking {}".format(commit.sha))
+        self.stats["commits scanned"] += 1
+
+        if self.scanner:
+            return self.scanner.scan_files(
+                commit, cache=self.cache, file_filter=self.file_filter, blobs=self.blobs)
+
+        return scan_files(
+            commit, self.keywords, cache=self.cache, file_filter=self.file_filter,
+            blobs=self.blobs)
+
+    def record_commit(self, repo, commit, matches):
+        if self.store:
+            self.store.append(repo.name, commit, time.time(), self.keywords.keywords)
+
+        if matches:
+            self.logger.info("Found: {}".format(matches))
+
+            # write the issue together with its marker (and anything buffered
+            # before it) so a crash can't leave an issue to be raised again
+            with transaction.atomic():
+                Issue.objects.create_from_commit(
+                    self.source.issue_commit(repo, commit), repo.name,
+                    matches, self.org_users)
+                self.mark_scanned(repo, commit.sha, flush=True)
+        else:
+            self.mark_scanned(repo, commit.sha)
+
+        if commit.sha in self.failed_commits:
+            # listed again (e.g. after a resume) and scanned this time
+            Failure.objects.filter(repository=repo.name, commit=commit.sha).delete()
+            self.failed_commits.discard(commit.sha)
+
+    def record_failure(self, repo, branch, commit, error):
+        Failure.objects.record(repo.name, branch, commit.sha, repr(error))
+        self.stats["commits failed"] += 1
+
+    def check_branch(self, repo, branch, start=None):
+        """
+        Scan the branch's new commits, returning how many could not be scanned.
+        """
+
+        failures = 0
+
+        for commit in self.new_commits(repo, branch, start):
+            try:
+                matches = self.scan_commit(self.source.fetch(commit))
+                self.record_commit(repo, commit, matches)
+            except SSLError as e:
+                self.logger.error("Connection error")
+                self.record_failure(repo, branch, commit, e)
+                failures += 1
+            except KeyboardInterrupt:
+                sys.exit()
+            except Exception as e:
+                self.logger.exception("An error has occurred")
+                self.record_failure(repo, branch, commit, e)
+                failures += 1
+
+        return failures
+
+    def check_branch_compare(self, repo, branch, base, head):
+        """
+        Scan the combined diff between the branch's last scanned head and its
+        current head from a single compare call.
+
+        If nothing is found every commit in between is marked as scanned.
+        Returns None, so the commits are fetched one at a time instead, when
+        there is a match to attribute to a commit, the branch no longer
+        descends from base or GitHub truncated the comparison.
+        """
+
+        try:
+            comparison = self.throttle.call(repo.compare, base, head)
+        except GithubException:
+            return None
+
+        if comparison.status != "ahead" or \
+                len(comparison.commits) < comparison.total_commits or \
+                len(comparison.files) >= COMPARE_MAX_FILES or \
+                any(f.patch is None for f in comparison.files):
+            self.stats["comparisons truncated"] += 1
+            return None
+
+        for file_ in comparison.files:
+            if self.file_filter.skip(file_.filename, file_.changes, file_.patch):
+                continue
+
+            if scan_patch(file_.patch, self.keywords):
+                return None
+
+        for commit in comparison.commits:
+            if commit.sha not in self.scanned_commits:
+                self.mark_scanned(repo, commit.sha)
+                self.stats["commits scanned by compare"] += 1
+
+        return 0
+
+    def check_branch_pipelined(self, repo, branch, start=None):
+        """
+        Fetch commits concurrently, scan them on one thread and write the
+        results from this one.
+        """
+
+        pipeline = Pipeline(
+            self.source.fetch, self.scan_commit,
+            workers=settings.CHECKER_FETCH_WORKERS,
+            scan_workers=settings.CHECKER_SCAN_PROCESSES or 1,
+            queue_size=settings.CHECKER_QUEUE_SIZE)
+
+        failures = 0
+
+        with pipeline:
+            for commit, result in pipeline.run(self.new_commits(repo, branch, start)):
                 try:
-                    if Repository.objects.filter(
-                            repository=repo.name, commit=commit.sha).exists():
-                        # we've already scanned this far, assume older
-                        # commits have already been scanned
-                        break
+                    self.record_commit(repo, commit, result.result())
+                except SSLError as e:
+                    self.logger.error("Connection error")
+                    self.record_failure(repo, branch, commit, e)
+                    failures += 1
+                except KeyboardInterrupt:
+                    sys.exit()
+                except Exception as e:
+                    self.logger.exception("An error has occurred")
+                    self.record_failure(repo, branch, commit, e)
+                    failures += 1
+
+        return failures
+
+
+def get_blob_scanner():
+    if not settings.CHECKER_SCAN_BLOBS:
+        return None
+
+    return BlobScanner(
+        settings.GITHUB_ACCESS_TOKEN, settings.CHECKER_BLOB_CHUNK_SIZE,
+        settings.CHECKER_BLOB_OVERLAP, settings.CHECKER_MAX_BLOB_SIZE)
+
+
+def get_patch_store():
+    if settings.CHECKER_PATCH_STORE_DIR:
+        return PatchStore(
+            settings.CHECKER_PATCH_STORE_DIR, settings.CHECKER_PATCH_STORE_SEGMENT_SIZE)
+
+
+def run_check(logger, sequential=None, shard=None):
+    CheckRun(logger, sequential=sequential, shard=shard).run()
+    send_queued_notifications(logger)
+
+
+def get_commit_fetcher(client, throttle):
+    """
+    Return a function that fetches a commit, files included, by repository
+    name and sha, looking each repository up only once.
+    """
+
+    repos = {}
+
+    def fetch(repository, sha):
+        if repository not in repos:
+            repos[repository] = throttle.call(
+                client.get_repo, "{}/{}".format(settings.GITHUB_ORGANISATION, repository))
+
+        commit = throttle.call(repos[repository].get_commit, sha)
+        throttle.call(lambda: commit.raw_data["files"])
+
+        return commit
+
+    return fetch
+
+
+def retry_failures(logger):
+    """
+    Fetch and scan the commits that failed during earlier runs, several at a
+    time, backing off each failure exponentially until it succeeds.
+    """
+
+    failures = list(Failure.objects.due().order_by("next_retry", "id"))
 
-                    logger.info("Checking {}".format(commit.sha))
+    if not failures:
+        return
+
+    # a later run may have scanned the commit through another branch or a fork
+    repositories = set(f.repository for f in failures)
+    commits = [f.commit for f in failures]
+    scanned = set(Repository.objects.filter(
+        repository__in=repositories, commit__in=commits).values_list("repository", "commit"))
+    scanned.update(PushedCommit.objects.filter(
+        repository__in=repositories, commit__in=commits, scanned=True
+    ).values_list("repository", "commit"))
+    already = [f for f in failures if (f.repository, f.commit) in scanned]
+
+    if already:
+        Failure.objects.filter(id__in=[f.id for f in already]).delete()
+        logger.info("{} failed commits have been scanned since".format(len(already)))
+
+    failures = [f for f in failures if (f.repository, f.commit) not in scanned]
+
+    if not failures:
+        return
+
+    keywords = get_keywords()
+    client = get_client()
+    throttle = Throttle(
+        client,
+        min_interval=settings.GITHUB_QUERY_SLEEP_TIME,
+        reserve=settings.GITHUB_RATE_LIMIT_RESERVE)
+    org_users = get_org_users()
+    fetch_commit = get_commit_fetcher(client, throttle)
+    file_filter = PathFilter.objects.file_filter()
+    blobs = get_blob_scanner()
+    store = get_patch_store()
+
+    def fetch(failure):
+        return fetch_commit(failure.repository, failure.commit)
+
+    def scan(commit):
+        return commit, scan_files(commit, keywords, file_filter=file_filter, blobs=blobs)
+
+    pipeline = Pipeline(
+        fetch, scan,
+        workers=settings.CHECKER_FETCH_WORKERS,
+        queue_size=settings.CHECKER_QUEUE_SIZE)
+
+    retried = 0
+
+    try:
+        with pipeline:
+            for failure, result in pipeline.run(failures):
+                try:
+                    commit, matches = result.result()
+                except KeyboardInterrupt:
+                    sys.exit()
+                except Exception as e:
+                    logger.error("Retry of {} {} failed: {!r}".format(
+                        failure.repository, failure.commit, e))
+                    failure.retry_later(repr(e))
+                    continue
 
-                    matches = scan_files(commit, keywords)
+                if store:
+                    store.append(failure.repository, commit, time.time(), keywords.keywords)
 
+                with transaction.atomic():
                     if matches:
                         logger.info("Found: {}".format(matches))
                         Issue.objects.create_from_commit(
-                            commit, repo.name, matches, org_users)
+                            commit, failure.repository, matches, org_users)
 
-                    Repository.objects.create(
-                        commit=commit.sha, repository=repo.name)
+                    Repository.objects.mark_scanned([(failure.repository, failure.commit)])
+                    failure.delete()
 
-                    time.sleep(settings.GITHUB_QUERY_SLEEP_TIME)
-                except SSLError:
-                    logger.error("Connection error")
-                    Failure.objects.create(
-                        repository=repo.name, branch=branch, commit=commit.sha)
-                except KeyboardInterrupt:
-                    sys.exit()
-                except:
-                    logger.exception("An error has occurred")
+                retried += 1
+    finally:
+        if store:
+            store.close()
+
+    logger.info("Retried {} of {} failed commits, {} awaiting retry".format(
+        retried, len(failures), Failure.objects.pending().count()))
+
+    send_queued_notifications(logger)
+
+
+def rescan_keywords(logger):
+    """
+    Scan the stored history for keywords added since it was scanned, raising
+    issues for commits that weren't scanned for each keyword.  Matches that
+    already have an issue are skipped, so a rescan cut short can simply be
+    run again.
+    """
+
+    keywords = list(Keyword.objects.filter(history_scanned=False).order_by("id"))
+    store = get_patch_store()
+
+    if not keywords or not store:
+        return
+
+    matcher = KeywordMatcher([k.text for k in keywords])
+    added = dict(
+        (k.text, calendar.timegm(k.added.timetuple()) if k.added else float("inf"))
+        for k in keywords)
+    org_users = get_org_users()
+    file_filter = PathFilter.objects.file_filter()
+    reported = Issue.objects.reported_matches()
+    count = 0
+
+    def scanned_for(record, keyword):
+        if record.get("keywords") is not None:
+            return keyword in record["keywords"]
+
+        # older records only have the time, commits scanned after a keyword
+        # was added were scanned for it then
+        return record["scanned"] >= added[keyword]
+
+    for record in store:
+        commit = StoredCommit(record)
+        count += 1
+
+        matches = [
+            (filename, keyword, line_number)
+            for filename, keyword, line_number in scan_files(commit, matcher, file_filter=file_filter)
+            if not scanned_for(record, keyword) and
+            (record["repository"], commit.sha, filename, keyword, line_number) not in reported
+        ]
+
+        if matches:
+            logger.info("Found in {} {}: {}".format(record["repository"], commit.sha, matches))
+            Issue.objects.create_from_commit(
+                commit, record["repository"], matches, org_users)
+
+    Keyword.objects.filter(id__in=[k.id for k in keywords]).update(history_scanned=True)
+
+    logger.info("Rescanned {} stored commits for {}".format(
+        count, ", ".join(k.text for k in keywords)))
+
+    send_queued_notifications(logger)
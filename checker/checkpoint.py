@@ -0,0 +1,91 @@
+import time
+
+from django.db import transaction
+
+from .models import Repository, BranchHead, RepositoryPush
+
+
+class Checkpoint(object):
+    """
+    Buffer scanned commit markers and write them in batches.
+
+    Markers are flushed in a single transaction once size markers are
+    waiting or the oldest has waited interval seconds, so a crash loses at
+    most one batch.  A branch's commits are marked newest first and listing
+    stops at the first marked commit, so the lost commits are only scanned
+    again because the run's branch cursors, flushed with the markers, send
+    a resumed run back to them.  That only happens if the run is resumed
+    within CHECKER_RESUME_HOURS; a new run would miss commits older than a
+    flushed marker.
+
+    Branch heads, repository push times and the run's progress are written
+    in the same transaction as (and never before) the markers of the commits
+    they cover.
+    """
+
+    def __init__(self, size, interval, run=None, clock=time.time):
+        self.size = size
+        self.interval = interval
+        self.run = run
+        self.clock = clock
+
+        self.markers = []
+        self.heads = {}
+        self.pushes = {}
+        self.cursors = {}
+        self.completed = []
+        self._oldest = None
+
+    def __len__(self):
+        return len(self.markers)
+
+    def add(self, repository, commit, flush=False, branch=None, head=None):
+        """
+        Buffer a marker for commit.  If branch is given the run's cursor for
+        it moves on to commit, listed from head.
+        """
+
+        if not self.markers:
+            self._oldest = self.clock()
+
+        self.markers.append((repository, commit))
+
+        if branch is not None:
+            self.cursors[(repository, branch)] = (head, commit)
+
+        if flush or len(self.markers) >= self.size or \
+                self.clock() - self._oldest >= self.interval:
+            self.flush()
+
+    def set_head(self, repository, branch, commit):
+        """
+        Record the head a branch has been checked up to, which also drops
+        the run's cursor for it.
+        """
+
+        self.heads[(repository, branch)] = commit
+        self.cursors[(repository, branch)] = None
+
+    def set_pushed_at(self, repository, pushed_at):
+        self.pushes[repository] = pushed_at
+
+    def set_completed(self, repository):
+        self.completed.append(repository)
+
+    def flush(self):
+        if not (self.markers or self.heads or self.pushes or self.cursors or self.completed):
+            return
+
+        with transaction.atomic():
+            Repository.objects.mark_scanned(self.markers)
+            BranchHead.objects.set_heads(self.heads)
+            RepositoryPush.objects.set_pushed_at(self.pushes)
+
+            if self.run:
+                self.run.save_progress(self.cursors, self.completed)
+
+        self.markers = []
+        self.heads = {}
+        self.pushes = {}
+        self.cursors = {}
+        self.completed = []
@@ -0,0 +1,184 @@
+import calendar
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+from github.GithubException import GithubException
+
+from .checker import CheckRun, get_respositories, get_shard_label
+from .models import Repository, Issue
+from .notifications import send_queued_notifications
+from .scheduler import Scheduler
+
+
+def get_timestamp(value):
+    return calendar.timegm(value.utctimetuple()) if value else None
+
+
+def get_hit_rates():
+    """
+    Return the issues raised per commit scanned for each repository that has
+    raised any.
+    """
+
+    scanned = dict(
+        Repository.objects.values_list("repository").annotate(Count("id")).order_by())
+    issues = Issue.objects.values_list("repository").annotate(Count("id")).order_by()
+
+    return {
+        repository: float(count) / scanned[repository]
+        for repository, count in issues if scanned.get(repository)
+    }
+
+
+class CheckDaemon(object):
+    """
+    Keep checking the organisation's repositories instead of sweeping them all
+    from cron.
+
+    The organisation is listed every CHECKER_DAEMON_LIST_INTERVAL seconds,
+    when keywords and org members are reloaded and anything pushed since it
+    was last checked is due straight away.  In between, each repository is
+    polled (one API call) on its own schedule and checked if it has been
+    pushed to, so recently active repositories are noticed within minutes.
+    Every call goes through the run's Throttle, which keeps the daemon within
+    the rate limit.
+    """
+
+    def __init__(self, logger, shard=None, clock=time.time):
+        self.logger = logger
+        self.shard = shard
+        self.clock = clock
+        self.scheduler = Scheduler(
+            settings.CHECKER_DAEMON_MIN_INTERVAL, settings.CHECKER_DAEMON_MAX_INTERVAL,
+            settings.CHECKER_DAEMON_AGE_FACTOR, clock=clock)
+        self.stopping = threading.Event()
+        self.run = None
+        self.listed = None
+        self.hit_rates = {}
+        # the last push time seen for each repository, a timestamp
+        self.pushed_at = {}
+
+    def stop(self, signum=None, frame=None):
+        self.logger.info("Stopping once the current repository has been checked")
+        self.stopping.set()
+
+    def serve(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        try:
+            while not self.stopping.is_set():
+                next_listing = self.listed + settings.CHECKER_DAEMON_LIST_INTERVAL \
+                    if self.listed is not None else self.clock()
+
+                if next_listing <= self.clock():
+                    try:
+                        self.start_run()
+                    except Exception:
+                        # try again at the next listing
+                        self.logger.exception("Couldn't list repositories")
+
+                    continue
+
+                name = self.scheduler.pop()
+
+                if name is None:
+                    wait = self.scheduler.wait_time()
+                    wait = next_listing - self.clock() if wait is None else \
+                        min(wait, next_listing - self.clock())
+                    self.stopping.wait(max(wait, 0))
+                    continue
+
+                self.poll(name)
+                send_queued_notifications(self.logger, held=False)
+        finally:
+            self.finish_run()
+
+    def start_run(self):
+        """
+        Start a new run with the current keywords and org members, and list
+        the repositories to schedule.
+        """
+
+        self.finish_run()
+
+        label = "daemon {}".format(get_shard_label(self.shard)).strip()
+
+        self.run = CheckRun(self.logger, shard=self.shard, label=label)
+        self.listed = self.clock()
+        self.hit_rates = get_hit_rates()
+
+        listed = set()
+
+        for repo in get_respositories(self.run.client, self.shard, self.run.throttle):
+            listed.add(repo.name)
+            checked = self.run.pushed_at.get(repo.name)
+
+            if repo.pushed_at and (checked is None or repo.pushed_at > checked):
+                self.schedule(repo, now=True)
+            elif repo.name not in self.scheduler:
+                self.schedule(repo)
+
+        for name in set(self.scheduler) - listed:
+            self.scheduler.remove(name)
+
+        self.logger.info("Listed {} repositories".format(len(listed)))
+
+    def finish_run(self):
+        if self.run is not None:
+            self.run.close()
+            self.run.run_state.finish()
+            self.run.report()
+            self.run = None
+
+    def schedule(self, repo, now=False):
+        self.pushed_at[repo.name] = get_timestamp(repo.pushed_at)
+        self.scheduler.schedule(
+            repo.name, self.pushed_at[repo.name], self.hit_rates.get(repo.name, 0), now=now)
+
+    def schedule_retry(self, name):
+        """
+        Schedule a repository that couldn't be fetched by the last push time
+        seen, or as soon as any is polled if there is none, so one failed
+        request doesn't leave a busy repository for max_interval.
+        """
+
+        pushed_at = self.pushed_at.get(name) or self.clock()
+        self.scheduler.schedule(name, pushed_at, self.hit_rates.get(name, 0))
+
+    def poll(self, name):
+        """
+        Fetch a due repository, check it if anything has been pushed and
+        schedule its next poll.
+        """
+
+        try:
+            repo = self.run.throttle.call(
+                self.run.client.get_repo, "{}/{}".format(settings.GITHUB_ORGANISATION, name))
+        except Exception as e:
+            if isinstance(e, GithubException) and e.status == 404:
+                self.logger.info("{} no longer exists".format(name))
+                self.pushed_at.pop(name, None)
+                return
+
+            # rate limited, a server error or the connection failed
+            self.logger.exception("Couldn't fetch {}".format(name))
+            self.schedule_retry(name)
+            return
+
+        if repo.private or self.run.excludes.excludes(name):
+            return
+
+        try:
+            self.run.check(repo)
+        except Exception:
+            self.logger.exception("Couldn't check {}".format(name))
+
+        self.schedule(repo)
+
+
+def run_daemon(logger, shard=None):
+    CheckDaemon(logger, shard=shard).serve()
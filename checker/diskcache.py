@@ -0,0 +1,95 @@
+import sqlite3
+import threading
+import time
+
+
+# once over max_bytes, the oldest entries are dropped until this fraction is left
+PRUNE_TO = 0.9
+
+
+class DiskStore(object):
+    """
+    A string key value store in an SQLite file, the on-disk tier of the scan
+    and HTTP caches.
+
+    SQLite locks the file, so run_check shards, the daemon and the other
+    workers can share one path.  The values are kept to max_bytes in total,
+    dropping the least recently written entries once it is exceeded.
+    """
+
+    def __init__(self, path, max_bytes, timeout=30):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # autocommit, transactions are begun explicitly
+        self._db = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "stored REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_stored ON entries (stored)")
+        # what this process thinks the total is, summed again once it looks
+        # like the limit has been reached or this process has written enough
+        # since that other processes' writes could have taken it over
+        self._size = self.size()
+        self._written = 0
+
+    def size(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+
+        return row[0] if row else None
+
+    def set(self, key, value):
+        size = len(value.encode("utf-8"))
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, stored) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()))
+            self._size += size
+            self._written += size
+
+            if self._size > self.max_bytes or self._written > self.max_bytes * (1 - PRUNE_TO):
+                self._prune()
+
+    def _prune(self):
+        self._db.execute("BEGIN IMMEDIATE")
+
+        try:
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            excess = total - int(self.max_bytes * PRUNE_TO)
+
+            if total > self.max_bytes:
+                keys = []
+
+                rows = self._db.execute("SELECT key, size FROM entries ORDER BY stored, rowid")
+
+                for key, size in rows:
+                    if excess <= 0:
+                        break
+
+                    keys.append((key,))
+                    excess -= size
+                    total -= size
+
+                self._db.executemany("DELETE FROM entries WHERE key = ?", keys)
+
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+        self._size = total
+        self._written = 0
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,80 @@
+import fnmatch
+import re
+
+
+MATCH_NAME = "name"
+MATCH_GLOB = "glob"
+MATCH_REGEX = "regex"
+
+
+def to_regex(pattern, match):
+    """
+    Return a regular expression matching what pattern matches as an exact
+    name, glob or regular expression.
+    """
+
+    if match == MATCH_GLOB:
+        # translate anchors the end itself, fullmatch anchors the start
+        return fnmatch.translate(pattern)
+
+    if match == MATCH_REGEX:
+        return pattern
+
+    return re.escape(pattern)
+
+
+def combine(patterns):
+    """
+    Compile regular expressions into one that fully matches any of them, or
+    None if there are none.
+    """
+
+    if not patterns:
+        return None
+
+    return re.compile("|".join("(?:{})".format(p) for p in patterns))
+
+
+class ExcludeRules(object):
+    """
+    Excluded repositories and branches, built once from (repository,
+    branch, match) rules so each check is a set lookup or a single regex
+    match rather than a pass over every rule.
+
+    A rule without a branch excludes the whole repository, otherwise only
+    the matching branches of the matching repositories.  Both are exact
+    names, globs or regular expressions according to match.
+    """
+
+    def __init__(self, rules):
+        self.names = set()
+        repository_patterns = []
+        # (repository regex, branch regex) for branch rules
+        self.branch_rules = []
+
+        for repository, branch, match in rules:
+            if branch:
+                self.branch_rules.append((to_regex(repository, match), to_regex(branch, match)))
+            elif match == MATCH_NAME:
+                self.names.add(repository)
+            else:
+                repository_patterns.append(to_regex(repository, match))
+
+        self.pattern = combine(repository_patterns)
+        # the combined branch pattern for each repository seen
+        self._branch_patterns = {}
+
+    def excludes(self, repository):
+        return repository in self.names or bool(
+            self.pattern and self.pattern.fullmatch(repository))
+
+    def excludes_branch(self, repository, branch):
+        if repository not in self._branch_patterns:
+            self._branch_patterns[repository] = combine([
+                branch_pattern for repository_pattern, branch_pattern in self.branch_rules
+                if re.fullmatch(repository_pattern, repository)
+            ])
+
+        pattern = self._branch_patterns[repository]
+
+        return bool(pattern and pattern.fullmatch(branch))
@@ -0,0 +1,84 @@
+import threading
+from collections import Counter
+
+from .excludes import combine, to_regex
+
+
+ACTION_INCLUDE = "include"
+ACTION_EXCLUDE = "exclude"
+
+
+def path_regex(pattern, match):
+    """
+    Return a regular expression for a path pattern.  Like .gitignore, a
+    pattern without a slash matches the file name in any directory.
+    """
+
+    regex = to_regex(pattern, match)
+
+    if "/" not in pattern:
+        return "(?:.*/)?(?:{})".format(regex)
+
+    return regex
+
+
+class FileFilter(object):
+    """
+    Decide which of a commit's files are worth scanning, from the filename,
+    the number of changed lines GitHub reports and the patch length, so
+    lockfiles, minified, vendored and generated files are dropped before
+    their patches are read.
+
+    A file matching an exclude rule is skipped unless it also matches an
+    include rule.  Skipped files and their patch bytes are counted in stats.
+    """
+
+    def __init__(self, rules=(), max_changes=None, max_size=None):
+        rules = list(rules)
+
+        self.include = combine(
+            [path_regex(p, m) for p, action, m in rules if action == ACTION_INCLUDE])
+        self.exclude = combine(
+            [path_regex(p, m) for p, action, m in rules if action == ACTION_EXCLUDE])
+        self.max_changes = max_changes
+        self.max_size = max_size
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def skip_reason(self, filename, changes=None, patch=None):
+        """
+        Return why a file should not be scanned, or None to scan it.
+        """
+
+        if self.exclude and self.exclude.fullmatch(filename) and not (
+                self.include and self.include.fullmatch(filename)):
+            return "path"
+
+        if self.max_changes and changes and changes > self.max_changes:
+            return "changes"
+
+        if self.max_size and patch and len(patch) > self.max_size:
+            return "size"
+
+        return None
+
+    def skip(self, filename, changes=None, patch=None):
+        reason = self.skip_reason(filename, changes, patch)
+
+        if reason:
+            with self._lock:
+                self.stats["files skipped by {}".format(reason)] += 1
+                self.stats["patch bytes skipped"] += len(patch or "")
+
+        return bool(reason)
+
+    def select(self, files):
+        """
+        Return the files from a GitHub commit's files list worth scanning.
+        The changes and size limits only apply to files with a patch.
+        """
+
+        return [
+            f for f in files if "patch" not in f and not self.skip(f["filename"]) or
+            "patch" in f and not self.skip(f["filename"], f.get("changes"), f["patch"])
+        ]
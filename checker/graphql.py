@@ -0,0 +1,232 @@
+import datetime
+
+import requests
+from github.GithubException import GithubException
+from github.Repository import Repository
+
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+REPOSITORY_URL = "https://api.github.com/repos/{}"
+# the most GitHub allows per connection
+REPOS_PER_QUERY = 100
+REFS_PER_QUERY = 100
+# repositories whose remaining branches are fetched in one query
+REF_QUERIES_PER_REQUEST = 20
+
+REFS_FIELDS = """
+refs(refPrefix: "refs/heads/", first: %d, after: %%s) {
+  pageInfo { hasNextPage endCursor }
+  nodes { name target { oid } }
+}
+""" % REFS_PER_QUERY
+
+REPOSITORIES_QUERY = """
+query($organisation: String!, $cursor: String) {
+  organization(login: $organisation) {
+    repositories(first: %d, after: $cursor, orderBy: {field: NAME, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        isPrivate
+        pushedAt
+        url
+        defaultBranchRef { name }
+        %s
+      }
+    }
+  }
+}
+""" % (REPOS_PER_QUERY, REFS_FIELDS % "null")
+
+REPOSITORY_REFS_QUERY = """
+%s: repository(owner: %s, name: %s) {
+  %s
+}
+"""
+
+
+class GraphQLError(Exception):
+    pass
+
+
+class DiscoveredCommit(object):
+    def __init__(self, sha):
+        self.sha = sha
+
+
+class DiscoveredBranch(object):
+    def __init__(self, name, sha):
+        self.name = name
+        self.commit = DiscoveredCommit(sha)
+
+
+class DiscoveredRepository(object):
+    """
+    A repository found by GraphQLDiscovery, shaped like the parts of a
+    PyGithub Repository the scan loop uses.  Anything else, such as listing
+    commits, is passed on to a PyGithub Repository built from the data the
+    query returned, so it doesn't have to be fetched.
+    """
+
+    def __init__(self, client, full_name, node, branches):
+        self.name = node["name"]
+        self.private = node["isPrivate"]
+        self.pushed_at = parse_datetime(node["pushedAt"])
+        self._pushed_at = node["pushedAt"]
+        self.default_branch = (node["defaultBranchRef"] or {}).get("name")
+        self.html_url = node["url"]
+        self.clone_url = node["url"] + ".git"
+        self.branches = branches
+
+        self._client = client
+        self._full_name = full_name
+        self._repo = None
+
+    def get_branches(self):
+        return [DiscoveredBranch(name, sha) for name, sha in self.branches]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        if self._repo is None:
+            self._repo = self._client.create_from_raw_data(Repository, dict(
+                name=self.name, full_name=self._full_name, private=self.private,
+                default_branch=self.default_branch, html_url=self.html_url,
+                clone_url=self.clone_url, url=REPOSITORY_URL.format(self._full_name),
+                pushed_at=self._pushed_at))
+
+        return getattr(self._repo, name)
+
+
+def parse_datetime(value):
+    # naive UTC, like PyGithub
+    return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ") if value else None
+
+
+def quote(value):
+    return '"{}"'.format(value.replace("\\", "\\\\").replace('"', '\\"'))
+
+
+class GraphQLDiscovery(object):
+    """
+    List the organisation's repositories with their branches and head
+    commits using the GraphQL API, a hundred repositories (and their first
+    hundred branches each) per request instead of a REST request for each
+    page of repositories and each repository's branches.
+
+    Requests go through throttle, if given, which backs off when GitHub
+    limits the rate of requests.
+    """
+
+    def __init__(self, client, token, organisation, session=None, throttle=None):
+        self.client = client
+        self.token = token
+        self.organisation = organisation
+        self.session = session or requests.Session()
+        self.throttle = throttle
+        self.requests = 0
+
+    def post(self, query, variables):
+        response = self.session.post(
+            GRAPHQL_URL, json=dict(query=query, variables=variables or {}),
+            headers={"Authorization": "bearer {}".format(self.token)})
+        self.requests += 1
+
+        if response.status_code in (403, 429):
+            # raised like PyGithub would, so the throttle can tell a rate
+            # limit from a refusal
+            try:
+                data = response.json()
+            except ValueError:
+                data = response.text
+
+            headers = dict(response.headers)
+
+            try:
+                error = GithubException(response.status_code, data, headers=headers)
+            except TypeError:
+                # PyGithub before 1.43 doesn't keep the headers
+                error = GithubException(response.status_code, data)
+                error.headers = headers
+
+            raise error
+
+        response.raise_for_status()
+
+        return response.json()
+
+    def query(self, query, variables=None):
+        if self.throttle:
+            result = self.throttle.call(self.post, query, variables)
+        else:
+            result = self.post(query, variables)
+
+        if result.get("errors"):
+            raise GraphQLError("; ".join(e.get("message", "") for e in result["errors"]))
+
+        return result["data"]
+
+    def repositories(self):
+        """
+        Yield a DiscoveredRepository for each of the organisation's
+        repositories, a page at a time.
+        """
+
+        cursor = None
+
+        while True:
+            data = self.query(
+                REPOSITORIES_QUERY, dict(organisation=self.organisation, cursor=cursor))
+
+            if data["organization"] is None:
+                raise GraphQLError("Organisation {} not found".format(self.organisation))
+
+            page = data["organization"]["repositories"]
+            nodes = page["nodes"]
+            branches = dict((node["name"], self.get_branches(node["refs"])) for node in nodes)
+
+            self.fetch_remaining_refs(
+                [(node["name"], node["refs"]["pageInfo"]["endCursor"]) for node in nodes
+                 if node["refs"]["pageInfo"]["hasNextPage"]],
+                branches)
+
+            for node in nodes:
+                yield DiscoveredRepository(
+                    self.client, "{}/{}".format(self.organisation, node["name"]),
+                    node, branches[node["name"]])
+
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+
+            cursor = page["pageInfo"]["endCursor"]
+
+    def get_branches(self, refs):
+        return [(ref["name"], ref["target"]["oid"]) for ref in refs["nodes"]]
+
+    def fetch_remaining_refs(self, pending, branches):
+        """
+        Add the branches past the first page to branches, for each (name,
+        cursor) in pending, several repositories to a query.
+        """
+
+        while pending:
+            batch = pending[:REF_QUERIES_PER_REQUEST]
+            pending = pending[REF_QUERIES_PER_REQUEST:]
+
+            data = self.query("query {%s}" % "".join(
+                REPOSITORY_REFS_QUERY % (
+                    "r{}".format(i), quote(self.organisation), quote(name),
+                    REFS_FIELDS % quote(cursor))
+                for i, (name, cursor) in enumerate(batch)))
+
+            for i, (name, _) in enumerate(batch):
+                if data["r{}".format(i)] is None:
+                    # deleted since it was listed
+                    continue
+
+                refs = data["r{}".format(i)]["refs"]
+                branches[name].extend(self.get_branches(refs))
+
+                if refs["pageInfo"]["hasNextPage"]:
+                    pending.append((name, refs["pageInfo"]["endCursor"]))
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from github.Requester import Requester
+
+from .diskcache import DiskStore
+
+
+# GET requests for organisation repo and member lists, repositories and branch lists
+CACHEABLE_URL_REGEX = re.compile(
+    r"^(/api/v3)?/(orgs/[^/]+/(repos|members)|repos/[^/]+/[^/?]+(/branches)?)(\?|$)")
+
+
+class CachedResponse(object):
+    """
+    A response replayed from the cache, shaped like the httplib responses
+    PyGithub reads.
+    """
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self._headers = headers
+        self._body = body
+
+    def getheaders(self):
+        return list(self._headers.items())
+
+    def read(self):
+        return self._body
+
+
+class ConditionalRequestCache(object):
+    """
+    Remember the ETag and body of cacheable GitHub API responses, so the same
+    request can be sent again with If-None-Match and a 304, which doesn't
+    count against the rate limit, answered from the cache.
+
+    Entries are kept in memory, evicting the least recently used once
+    max_entries are held, or in an SQLite file at path that every worker
+    can share, holding up to max_bytes of them.
+    """
+
+    def __init__(self, max_entries, path=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.stats = Counter()
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = DiskStore(path, max_bytes) if path else None
+
+    def key(self, url, headers):
+        # responses depend on who is asking
+        authorization = dict((k.lower(), v) for k, v in headers.items()).get("authorization", "")
+
+        return hashlib.sha1("{}\n{}".format(authorization, url).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if self._disk is not None:
+                value = self._disk.get(key)
+
+                return json.loads(value) if value is not None else None
+
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            if self._disk is not None:
+                self._disk.set(key, json.dumps(entry))
+                return
+
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.stats[name] += value
+
+    def connection_class(self, base):
+        """
+        Return a connection class wrapping base that sends cacheable requests
+        conditionally.
+        """
+
+        return type(str("Caching" + base.__name__), (CachingConnection,), dict(cache=self, base=base))
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+
+class CachingConnection(object):
+    cache = None
+    base = None
+
+    def __init__(self, *args, **kwargs):
+        self._connection = self.base(*args, **kwargs)
+        self._key = None
+        self._entry = None
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def request(self, verb, url, body=None, headers=None, *args, **kwargs):
+        headers = dict(headers or {})
+        self._key = self._entry = None
+
+        if verb == "GET" and CACHEABLE_URL_REGEX.match(url):
+            self._key = self.cache.key(url, headers)
+            self._entry = self.cache.get(self._key)
+
+            if self._entry is not None:
+                headers["If-None-Match"] = self._entry["etag"]
+
+        self._connection.request(verb, url, body, headers, *args, **kwargs)
+
+    def getresponse(self):
+        response = self._connection.getresponse()
+
+        if self._key is None:
+            return response
+
+        body = response.read()
+        headers = dict((k.lower(), v) for k, v in response.getheaders())
+
+        if response.status == 304 and self._entry is not None:
+            self.cache.count("hits")
+            self.cache.count("bytes saved", len(self._entry["body"]))
+
+            # the 304 has the current rate limit, the cached headers the rest
+            cached = dict(self._entry["headers"])
+            cached.update(headers)
+            body = self._entry["body"]
+
+            return CachedResponse(
+                200, cached, body.encode("utf-8") if self._entry["bytes"] else body)
+
+        self.cache.count("misses")
+
+        if response.status == 200 and "etag" in headers:
+            self.cache.set(self._key, dict(
+                etag=headers["etag"], headers=headers, bytes=isinstance(body, bytes),
+                body=body.decode("utf-8") if isinstance(body, bytes) else body))
+
+        return CachedResponse(response.status, headers, body)
+
+    def close(self):
+        self._connection.close()
+
+
+def install(cache):
+    """
+    Send every GitHub client's requests through cache.
+    """
+
+    Requester.injectConnectionClasses(
+        cache.connection_class(Requester._Requester__httpConnectionClass),
+        cache.connection_class(Requester._Requester__httpsConnectionClass))
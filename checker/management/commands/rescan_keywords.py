@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from checker.checker import rescan_keywords
+
+import logging
+
+
+class Command(BaseCommand):
+    help = "Scan the stored commit history for newly added keywords"
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        rescan_keywords(logger)
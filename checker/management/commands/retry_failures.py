@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from checker.checker import retry_failures
+
+import logging
+
+
+class Command(BaseCommand):
+    help = "Retry the commits that could not be scanned by run_check"
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        retry_failures(logger)
@@ -1,11 +1,28 @@
 from django.core.management.base import BaseCommand, CommandError
 
-from checker.checker import run_check
+from checker.checker import parse_shard, run_check
 
 import logging
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sequential", action="store_true", default=None,
+            help="Fetch and scan one commit at a time")
+        parser.add_argument(
+            "--shard", default=None,
+            help="Only check shard i of N of the repositories, given as i/N")
+
     def handle(self, *args, **options):
         logger = logging.getLogger(__name__)
-        run_check(logger)
+
+        shard = None
+
+        if options["shard"]:
+            try:
+                shard = parse_shard(options["shard"])
+            except ValueError:
+                raise CommandError("--shard must be given as i/N, with i between 0 and N - 1")
+
+        run_check(logger, sequential=options["sequential"], shard=shard)
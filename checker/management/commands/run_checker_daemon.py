@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from checker.checker import parse_shard
+from checker.daemon import run_daemon
+
+import logging
+
+
+class Command(BaseCommand):
+    help = "Keep checking repositories as they are pushed to, until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--shard", default=None,
+            help="Only check shard i of N of the repositories, given as i/N")
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+
+        shard = None
+
+        if options["shard"]:
+            try:
+                shard = parse_shard(options["shard"])
+            except ValueError:
+                raise CommandError("--shard must be given as i/N, with i between 0 and N - 1")
+
+        run_daemon(logger, shard=shard)
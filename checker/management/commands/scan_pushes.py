@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from checker.pushes import scan_pushes
+
+import logging
+
+
+class Command(BaseCommand):
+    help = "Scan the commits queued by the push webhook as they arrive, until stopped"
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        scan_pushes(logger)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from checker.notifications import send_notifications
+
+import logging
+
+
+class Command(BaseCommand):
+    help = "Email issue authors the notifications queued by the checker, until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", default=False,
+            help="Send the notifications that are due and exit")
+
+    def handle(self, *args, **options):
+        logger = logging.getLogger(__name__)
+        send_notifications(logger, once=options["once"])
@@ -0,0 +1,111 @@
+import hashlib
+import re
+
+
+# a keyword with a non word character either side, as searched for before the matcher
+KEYWORD_SEARCH_REGEX = "[^\w]{{1}}{keyword}[^\w]{{1}}"
+
+KEYWORD_GROUP = "k{}"
+
+# compiled alternations kept per matcher, one for each subset of keywords searched
+PATTERN_CACHE_SIZE = 128
+
+
+class KeywordMatcher(object):
+    """
+    Match every keyword against a piece of text in a single pass.
+
+    All keywords are compiled into one alternation that keeps the boundary
+    rules of KEYWORD_SEARCH_REGEX - a non word character either side of the
+    keyword.  An alternation only reports one keyword per position, so a
+    keyword hidden behind an earlier one (or overlapping a previous match) is
+    picked up by re-scanning with just the keywords not found yet.  Each
+    extra pass has to find at least one new keyword, so in practice this is
+    one or two passes regardless of the number of keywords.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = tuple(keywords)
+        self.version = hashlib.sha1(
+            "\n".join(self.keywords).encode("utf-8")).hexdigest()
+        self._patterns = {}
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def _compile(self, indexes):
+        pattern = self._patterns.get(indexes)
+
+        if pattern is None:
+            alternation = "|".join(
+                "(?P<{}>{})".format(KEYWORD_GROUP.format(i), self.keywords[i])
+                for i in indexes)
+            pattern = re.compile(
+                "(?<=[^\w])(?:{})(?=[^\w])".format(alternation), re.I)
+
+            if len(self._patterns) >= PATTERN_CACHE_SIZE:
+                self._patterns.clear()
+
+            self._patterns[indexes] = pattern
+
+        return pattern
+
+    def find(self, text, pos=0, endpos=None, indexes=None):
+        """
+        Return the indexes of the keywords found in text[pos:endpos].
+
+        text must already be lowercased.  Like the slice, nothing past endpos
+        is visible, but the boundary before pos is still checked against the
+        character preceding it.  indexes limits the search to those keywords.
+        """
+
+        if endpos is None:
+            endpos = len(text)
+
+        if indexes is None:
+            indexes = range(len(self.keywords))
+
+        remaining = tuple(indexes)
+        found = set()
+
+        while remaining:
+            new = set()
+
+            for match in self._compile(remaining).finditer(text, pos, endpos):
+                for name, value in match.groupdict().items():
+                    if value is not None:
+                        new.add(int(name[1:]))
+
+            if not new:
+                break
+
+            found.update(new)
+            remaining = tuple(i for i in remaining if i not in new)
+
+        return found
+
+    def search(self, text):
+        """
+        Return the keywords found in text, in keyword order.
+        """
+
+        return [self.keywords[i] for i in sorted(self.find(text.lower()))]
+
+
+_matcher = None
+
+
+def get_matcher(keywords):
+    """
+    Return a matcher for keywords, reusing the last one built if the keyword
+    set has not changed.
+    """
+
+    global _matcher
+
+    keywords = tuple(keywords)
+
+    if _matcher is None or _matcher.keywords != keywords:
+        _matcher = KeywordMatcher(keywords)
+
+    return _matcher
@@ -0,0 +1,107 @@
+import requests
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OrgMemberPage
+
+
+MEMBERS_URL = "https://api.github.com/orgs/{}/members"
+MEMBERS_PER_PAGE = 100
+
+
+class OrgMembers(object):
+    """
+    The set of the organisation's member logins, kept in the database and
+    looked up in constant time.
+
+    Once the ttl has passed since it was last refreshed, the next lookup asks
+    GitHub for each page of the member list again, sending the ETag of the
+    stored page so unchanged pages come back as 304s, which don't count
+    against the rate limit.
+    """
+
+    def __init__(self, token, organisation, ttl, session=None):
+        self.token = token
+        self.organisation = organisation
+        self.ttl = ttl
+        self.session = session or requests.Session()
+
+        self.hits = 0
+        self.refreshes = 0
+        self.pages_unchanged = 0
+        self.pages_fetched = 0
+
+        self._logins = set()
+        self._refreshed = None
+        self._load()
+
+    def __contains__(self, login):
+        if self._refreshed is None or timezone.now() - self._refreshed >= self.ttl:
+            self.refresh()
+
+        self.hits += 1
+
+        return login in self._logins
+
+    def __len__(self):
+        return len(self._logins)
+
+    def _load(self):
+        pages = list(OrgMemberPage.objects.all())
+
+        self._logins = set(login for page in pages for login in page.logins.split("\n") if login)
+        self._refreshed = min(page.fetched for page in pages) if pages else None
+
+    def refresh(self):
+        """
+        Fetch whatever has changed in the member list since it was stored.
+        """
+
+        stored = dict((page.page, page) for page in OrgMemberPage.objects.all())
+        now = timezone.now()
+        number = 1
+
+        with transaction.atomic():
+            while True:
+                page = stored.get(number) or OrgMemberPage(page=number)
+                headers = {"Authorization": "token {}".format(self.token)}
+
+                if page.etag:
+                    headers["If-None-Match"] = page.etag
+
+                response = self.session.get(
+                    MEMBERS_URL.format(self.organisation), headers=headers,
+                    params={"per_page": MEMBERS_PER_PAGE, "page": number})
+                response.raise_for_status()
+
+                if response.status_code == 304:
+                    self.pages_unchanged += 1
+                    logins = page.logins.split("\n") if page.logins else []
+                else:
+                    self.pages_fetched += 1
+                    logins = [member["login"] for member in response.json()]
+                    page.etag = response.headers.get("ETag", "")
+                    page.logins = "\n".join(logins)
+
+                page.fetched = now
+                page.save()
+
+                if len(logins) < MEMBERS_PER_PAGE:
+                    break
+
+                number += 1
+
+            # the list got shorter
+            OrgMemberPage.objects.filter(page__gt=number).delete()
+
+        self.refreshes += 1
+        self._load()
+
+    def report(self):
+        return [
+            ("org member lookups", self.hits),
+            ("org member refreshes", self.refreshes),
+            ("org member pages unchanged", self.pages_unchanged),
+            ("org member pages fetched", self.pages_fetched),
+        ]
+
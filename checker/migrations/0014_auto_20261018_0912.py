@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import Min, Count
+
+
+def remove_duplicate_commits(apps, schema_editor):
+    Repository = apps.get_model("checker", "Repository")
+
+    duplicates = Repository.objects.values("repository", "commit").annotate(
+        first_id=Min("id"), count=Count("id")).filter(count__gt=1)
+
+    for duplicate in duplicates:
+        Repository.objects.filter(
+            repository=duplicate["repository"], commit=duplicate["commit"]).exclude(
+            id=duplicate["first_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0013_auto_20170817_1028'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_commits, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='repository',
+            unique_together=set([('repository', 'commit')]),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0014_auto_20261018_0912'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepositoryPush',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repository', models.CharField(max_length=255, unique=True)),
+                ('pushed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BranchHead',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repository', models.CharField(max_length=255)),
+                ('branch', models.CharField(max_length=255)),
+                ('commit', models.CharField(max_length=255)),
+                ('checked', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': set([('repository', 'branch')]),
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 09:45
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0015_auto_20261018_0930'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='keyword',
+            name='added',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        # existing keywords have been scanned for since before history was stored
+        migrations.AddField(
+            model_name='keyword',
+            name='history_scanned',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='keyword',
+            name='history_scanned',
+            field=models.BooleanField(default=False),
+        ),
+    ]
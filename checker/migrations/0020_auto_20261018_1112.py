@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 11:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0019_auto_20261018_1051'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushedCommit',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repository', models.CharField(max_length=255)),
+                ('branch', models.CharField(max_length=255)),
+                ('commit', models.CharField(max_length=255)),
+                ('received', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': set([('repository', 'commit')]),
+            },
+        ),
+    ]
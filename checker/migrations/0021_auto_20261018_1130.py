@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 11:30
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0020_auto_20261018_1112'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrgMemberPage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.PositiveIntegerField(unique=True)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('logins', models.TextField(blank=True)),
+                ('fetched', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 11:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0021_auto_20261018_1130'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exclude',
+            name='branch',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='exclude',
+            name='match',
+            field=models.CharField(choices=[('name', 'Exact name'), ('glob', 'Glob pattern'), ('regex', 'Regular expression')], default='name', max_length=10),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 12:14
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+# lockfiles, minified assets and vendored dependencies
+DEFAULT_EXCLUDES = [
+    "package-lock.json", "*.lock", "*.min.js", "*.min.css", "*.map",
+    "node_modules/*", "*/node_modules/*", "vendor/*", "*/vendor/*",
+]
+
+
+def add_default_filters(apps, schema_editor):
+    PathFilter = apps.get_model("checker", "PathFilter")
+
+    PathFilter.objects.bulk_create(
+        [PathFilter(pattern=pattern, action="exclude", match="glob") for pattern in DEFAULT_EXCLUDES])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0022_auto_20261018_1152'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PathFilter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pattern', models.CharField(max_length=255)),
+                ('action', models.CharField(choices=[('exclude', 'Skip matching files'), ('include', 'Scan matching files even if excluded')], default='exclude', max_length=10)),
+                ('match', models.CharField(choices=[('name', 'Exact name'), ('glob', 'Glob pattern'), ('regex', 'Regular expression')], default='glob', max_length=10)),
+            ],
+        ),
+        migrations.RunPython(add_default_filters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11 on 2026-10-18 13:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checker', '0024_auto_20261018_1235'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pushedcommit',
+            name='scanned',
+            field=models.BooleanField(default=False),
+        ),
+    ]
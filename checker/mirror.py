@@ -0,0 +1,175 @@
+import os
+import subprocess
+
+
+# printed before each commit in git log output, a NUL can't appear in a diff
+COMMIT_MARKER = "\x00"
+COMMIT_FORMAT = "--format=%x00%H"
+
+
+class LocalCommit(object):
+    """
+    A commit read from a local mirror, shaped like the parts of a PyGithub
+    Commit that scan_files uses.
+    """
+
+    def __init__(self, sha, files, html_url=None):
+        self.sha = sha
+        self.raw_data = {"files": files}
+        self.html_url = html_url
+        self.author = None
+
+
+class Mirror(object):
+    """
+    A bare mirror of a repository kept on local disk.
+    """
+
+    def __init__(self, path, url):
+        self.path = path
+        self.url = url
+
+    def git(self, *args):
+        return subprocess.check_output(
+            ["git", "--git-dir", self.path] + list(args)).decode("utf-8")
+
+    def update(self):
+        """
+        Clone the mirror if it doesn't exist yet, otherwise fetch new commits.
+        """
+
+        if os.path.exists(self.path):
+            self.git("remote", "update", "--prune")
+        else:
+            subprocess.check_output(
+                ["git", "clone", "--mirror", "--quiet", self.url, self.path])
+
+    def branches(self):
+        """
+        Return a dict of branch name to head commit.
+        """
+
+        output = self.git(
+            "for-each-ref", "refs/heads", "--format=%(refname:short) %(objectname)")
+
+        return dict(line.rsplit(" ", 1) for line in output.splitlines())
+
+    def log(self, ref, html_url=None):
+        """
+        Yield the commits reachable from ref, a branch's full ref name or a
+        commit, newest first as LocalCommits, streaming
+        the patches from git log rather than reading the whole history.
+
+        Like the API listing, merge commits are yielded without files.  Raises
+        CalledProcessError once the output is read if git log failed.
+        """
+
+        args = ["git", "--git-dir", self.path, "-c", "core.quotePath=false",
+                "log", "-p", "--no-color", "--no-ext-diff", COMMIT_FORMAT, ref, "--"]
+        process = subprocess.Popen(args, stdout=subprocess.PIPE)
+        finished = False
+
+        try:
+            lines = (line.decode("utf-8", "replace").rstrip("\n") for line in process.stdout)
+
+            for sha, files in parse_log(lines):
+                yield LocalCommit(
+                    sha, files,
+                    html_url="{}/commit/{}".format(html_url, sha) if html_url else None)
+
+            finished = True
+        finally:
+            process.stdout.close()
+
+            if not finished:
+                # listing stopped early, at a commit already scanned
+                process.kill()
+
+            returncode = process.wait()
+
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, args)
+
+
+def parse_log(lines):
+    """
+    Parse git log -p output into (sha, files) pairs, where files matches the
+    files list of the GitHub commit API: dicts of filename and, unless the
+    file is binary or empty, patch (the hunks without the diff header).
+    """
+
+    sha, files, file_, patch = None, [], None, None
+
+    def finish_file():
+        if file_ is not None:
+            if patch is not None:
+                file_["patch"] = "\n".join(patch)
+
+            files.append(file_)
+
+    for line in lines:
+        if line.startswith(COMMIT_MARKER):
+            finish_file()
+
+            if sha is not None:
+                yield sha, files
+
+            sha, files, file_, patch = line[len(COMMIT_MARKER):], [], None, None
+
+        elif line.startswith("diff --git "):
+            finish_file()
+            file_, patch = {"filename": line.split(" b/", 1)[-1]}, None
+
+        elif file_ is None:
+            continue
+
+        elif patch is not None:
+            # hunk lines always start with a prefix, empty lines separate commits
+            if line:
+                patch.append(line)
+
+        elif line.startswith("+++ b/"):
+            file_["filename"] = line[len("+++ b/"):]
+
+        elif line.startswith("@@"):
+            patch = [line]
+
+    finish_file()
+
+    if sha is not None:
+        yield sha, files
+
+
+class MirrorSource(object):
+    """
+    Read branches and commits from local mirrors, only using the API for
+    the commits that need an issue raising.
+    """
+
+    can_compare = False
+
+    def __init__(self, directory, throttle):
+        self.directory = directory
+        self.throttle = throttle
+        self.mirror = None
+
+    def get_mirror(self, repo):
+        return Mirror(
+            os.path.join(self.directory, "{}.git".format(repo.name)), repo.clone_url)
+
+    def branches(self, repo):
+        self.mirror = self.get_mirror(repo)
+        self.mirror.update()
+
+        branches = self.mirror.branches()
+
+        return sorted(branches.items(), key=lambda b: b[0] != repo.default_branch)
+
+    def commits(self, repo, branch, start=None):
+        return self.mirror.log(start or "refs/heads/" + branch, html_url=repo.html_url)
+
+    def fetch(self, commit):
+        return commit
+
+    def issue_commit(self, repo, commit):
+        return self.throttle.call(repo.get_commit, commit.sha)
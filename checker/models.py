@@ -1,33 +1,116 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import datetime
 import os
+import random
+import re
 import uuid
+from collections import OrderedDict
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction, IntegrityError
+from django.db.models import Q
 from django.urls import reverse
 from django.conf import settings
-from django.core.mail import send_mail
+from django.utils import timezone
+from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 
+from .excludes import ExcludeRules, MATCH_NAME, MATCH_GLOB, MATCH_REGEX
+from .filters import FileFilter, ACTION_INCLUDE, ACTION_EXCLUDE
+
+
+class ExcludeManager(models.Manager):
+    def rules(self):
+        """
+        Return every exclude compiled into ExcludeRules
+        """
+
+        return ExcludeRules(self.values_list("repository", "branch", "match"))
+
 
 class Exclude(models.Model):
     """
-    Excluded repositories
+    Excluded repositories, or branches of them
     """
 
+    MATCH_CHOICES = (
+        (MATCH_NAME, "Exact name"),
+        (MATCH_GLOB, "Glob pattern"),
+        (MATCH_REGEX, "Regular expression"),
+    )
+
     repository = models.CharField(max_length=255)
+    # only exclude matching branches if set
+    branch = models.CharField(max_length=255, blank=True, default="")
+    match = models.CharField(max_length=10, choices=MATCH_CHOICES, default=MATCH_NAME)
+
+    objects = ExcludeManager()
+
+    def clean(self):
+        if self.match == MATCH_REGEX:
+            for field in ("repository", "branch"):
+                try:
+                    re.compile(getattr(self, field))
+                except re.error as e:
+                    raise ValidationError({field: "Invalid regular expression: {}".format(e)})
 
     def __unicode__(self):
+        if self.branch:
+            return "{} / {}".format(self.repository, self.branch)
+
         return self.repository
 
 
+class PathFilterManager(models.Manager):
+    def file_filter(self):
+        """
+        Return a FileFilter for every path filter and the size caps
+        """
+
+        return FileFilter(
+            self.values_list("pattern", "action", "match"),
+            max_changes=settings.CHECKER_MAX_FILE_CHANGES,
+            max_size=settings.CHECKER_MAX_PATCH_SIZE)
+
+
+class PathFilter(models.Model):
+    """
+    Paths to skip when scanning, or to scan despite an exclude
+    """
+
+    ACTION_CHOICES = (
+        (ACTION_EXCLUDE, "Skip matching files"),
+        (ACTION_INCLUDE, "Scan matching files even if excluded"),
+    )
+
+    pattern = models.CharField(max_length=255)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, default=ACTION_EXCLUDE)
+    match = models.CharField(max_length=10, choices=Exclude.MATCH_CHOICES, default=MATCH_GLOB)
+
+    objects = PathFilterManager()
+
+    def clean(self):
+        if self.match == MATCH_REGEX:
+            try:
+                re.compile(self.pattern)
+            except re.error as e:
+                raise ValidationError({"pattern": "Invalid regular expression: {}".format(e)})
+
+    def __unicode__(self):
+        return "{} {}".format(self.action, self.pattern)
+
+
 class Keyword(models.Model):
     """
     Keywords to scan for
     """
 
     text = models.CharField(max_length=255)
+    added = models.DateTimeField(auto_now_add=True, null=True)
+    # set once the stored history has been scanned for the keyword
+    history_scanned = models.BooleanField(default=False)
 
     def save(self, *args, **kwargs):
         self.text = self.text.lower()
@@ -38,15 +121,84 @@ class Keyword(models.Model):
         return self.text
 
 
+class FailureManager(models.Manager):
+    def pending(self):
+        """
+        Failures that will be retried
+        """
+
+        return self.filter(attempts__lt=settings.CHECKER_RETRY_MAX_ATTEMPTS)
+
+    def due(self):
+        """
+        Failures whose next retry is due
+        """
+
+        return self.pending().filter(
+            models.Q(next_retry__isnull=True) | models.Q(next_retry__lte=timezone.now()))
+
+    def record(self, repository, branch, commit, error):
+        failure, _ = self.get_or_create(
+            repository=repository, commit=commit, defaults=dict(branch=branch))
+        failure.last_error = error
+        failure.save()
+
+        return failure
+
+
 class Failure(models.Model):
     commit = models.CharField(max_length=255)
     repository = models.CharField(max_length=255)
     branch = models.CharField(max_length=255)
+    attempts = models.PositiveIntegerField(default=0)
+    next_retry = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    objects = FailureManager()
+
+    def retry_later(self, error):
+        """
+        Record a failed retry, backing off exponentially with some jitter
+        """
+
+        delay = min(
+            settings.CHECKER_RETRY_BACKOFF * 2 ** self.attempts,
+            settings.CHECKER_RETRY_MAX_BACKOFF)
+
+        self.attempts += 1
+        self.last_error = error
+        self.next_retry = timezone.now() + datetime.timedelta(
+            seconds=delay * random.uniform(1, 1.5))
+        self.save()
 
     def __unicode__(self):
         return "{} / {} / {}".format(self.repository, self.branch, self.commit)
 
 
+class RepositoryManager(models.Manager):
+    def scanned_commits(self, repository):
+        """
+        Return the set of commits already scanned in repository
+        """
+
+        return set(self.filter(
+            repository=repository).values_list("commit", flat=True))
+
+    def mark_scanned(self, markers):
+        """
+        Insert (repository, commit) markers in one statement, falling back to
+        inserting them one at a time if another run already added some.
+        """
+
+        try:
+            with transaction.atomic():
+                self.bulk_create(
+                    [Repository(repository=r, commit=c) for r, c in markers])
+        except IntegrityError:
+            for repository, commit in markers:
+                self.get_or_create(repository=repository, commit=commit)
+
+
 class Repository(models.Model):
 
     checked = models.DateTimeField(auto_now_add=True, blank=True, null=True)
@@ -54,20 +206,356 @@ class Repository(models.Model):
 
     repository = models.CharField(max_length=255)
 
+    objects = RepositoryManager()
+
     def __unicode__(self):
         return "{} - {}".format(self.repository, self.hash)
 
     class Meta:
         verbose_name_plural = "Repositories"
+        unique_together = (("repository", "commit"),)
+
+
+class BranchHeadManager(models.Manager):
+    def heads(self, repository):
+        """
+        Return the last scanned head commit of each branch in repository
+        """
+
+        return dict(self.filter(
+            repository=repository).values_list("branch", "commit"))
+
+    def set_heads(self, heads):
+        for (repository, branch), commit in heads.items():
+            self.update_or_create(
+                repository=repository, branch=branch, defaults=dict(commit=commit))
+
+
+class BranchHead(models.Model):
+    """
+    The head commit of a branch the last time all of it was scanned
+    """
+
+    repository = models.CharField(max_length=255)
+    branch = models.CharField(max_length=255)
+    commit = models.CharField(max_length=255)
+    checked = models.DateTimeField(auto_now=True)
+
+    objects = BranchHeadManager()
+
+    def __unicode__(self):
+        return "{} / {} / {}".format(self.repository, self.branch, self.commit)
+
+    class Meta:
+        unique_together = (("repository", "branch"),)
+
+
+class RepositoryPushManager(models.Manager):
+    def pushed_at(self):
+        """
+        Return the last scanned push time of every repository
+        """
+
+        return dict(self.values_list("repository", "pushed_at"))
+
+    def set_pushed_at(self, pushes):
+        for repository, pushed_at in pushes.items():
+            self.update_or_create(
+                repository=repository, defaults=dict(pushed_at=pushed_at))
+
+
+class RepositoryPush(models.Model):
+    """
+    The repository's pushed_at time the last time all its branches were scanned
+    """
+
+    repository = models.CharField(max_length=255, unique=True)
+    pushed_at = models.DateTimeField()
+
+    objects = RepositoryPushManager()
+
+    def __unicode__(self):
+        return "{} / {}".format(self.repository, self.pushed_at)
+
+
+class RunManager(models.Manager):
+    def resume_or_start(self, window, shard=""):
+        """
+        Return the shard's last run if it didn't finish and started less than
+        window ago, otherwise start a new one.
+        """
+
+        run = self.filter(shard=shard).order_by("-started").first()
+
+        if run and not run.finished and run.started > timezone.now() - window:
+            return run
+
+        return self.create(shard=shard)
+
+
+class Run(models.Model):
+    """
+    A run of run_check, kept so that a restarted run can carry on from where
+    the last one stopped
+    """
+
+    started = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(blank=True, null=True)
+    # "i/N" for a run_check --shard i/N worker
+    shard = models.CharField(max_length=255, blank=True, default="")
+
+    objects = RunManager()
+
+    def __unicode__(self):
+        return "{} - {}".format(self.started, self.finished or "unfinished")
+
+    def completed_repositories(self):
+        return set(self.repositories.values_list("repository", flat=True))
+
+    def cursors(self, repository):
+        """
+        Return the (head, last recorded commit) each branch of repository had
+        reached in this run
+        """
+
+        return dict(
+            (c.branch, (c.head, c.commit))
+            for c in self.branch_cursors.filter(repository=repository))
+
+    def save_progress(self, cursors, completed):
+        """
+        Save the branch cursors, deleting those set to None for branches
+        that have been fully checked, and the completed repositories
+        """
+
+        for (repository, branch), cursor in cursors.items():
+            if cursor is None:
+                self.branch_cursors.filter(repository=repository, branch=branch).delete()
+            else:
+                head, commit = cursor
+                RunCursor.objects.update_or_create(
+                    run=self, repository=repository, branch=branch,
+                    defaults=dict(head=head, commit=commit))
+
+        RunRepository.objects.bulk_create(
+            [RunRepository(run=self, repository=r) for r in completed])
+
+    def finish(self):
+        self.finished = timezone.now()
+        self.save()
+
+
+class RunRepository(models.Model):
+    """
+    A repository all of whose branches have been checked during a run
+    """
+
+    run = models.ForeignKey(Run, related_name="repositories", on_delete=models.CASCADE)
+    repository = models.CharField(max_length=255)
+
+    def __unicode__(self):
+        return self.repository
+
+
+class RunCursor(models.Model):
+    """
+    How far a run got through a branch: the head commit it started from and
+    the last commit it recorded, which a restarted run lists commits from
+    """
+
+    run = models.ForeignKey(Run, related_name="branch_cursors", on_delete=models.CASCADE)
+    repository = models.CharField(max_length=255)
+    branch = models.CharField(max_length=255)
+    head = models.CharField(max_length=255)
+    commit = models.CharField(max_length=255)
+
+    def __unicode__(self):
+        return "{} / {} / {}".format(self.repository, self.branch, self.commit)
+
+    class Meta:
+        unique_together = (("run", "repository", "branch"),)
+
+
+class RepositoryLeaseManager(models.Manager):
+    def acquire(self, repository, owner, duration):
+        """
+        Take or renew the lease on repository for owner, returning False if
+        another worker holds an unexpired lease on it
+        """
+
+        now = timezone.now()
+
+        with transaction.atomic():
+            lease = self.select_for_update(skip_locked=True).filter(
+                repository=repository).first()
+
+            if lease is None:
+                try:
+                    with transaction.atomic():
+                        self.create(
+                            repository=repository, owner=owner, expires=now + duration)
+                except IntegrityError:
+                    # another worker holds the row locked or just created it
+                    return False
+
+                return True
+
+            if lease.owner != owner and lease.expires > now:
+                return False
+
+            lease.owner = owner
+            lease.expires = now + duration
+            lease.save()
+
+        return True
+
+    def release(self, repository, owner):
+        self.filter(repository=repository, owner=owner).delete()
+
+
+class RepositoryLease(models.Model):
+    """
+    A worker's claim on a repository while it checks it, so several run_check
+    workers never check the same repository at once.  A lease left behind by
+    a crashed worker can be taken once it expires.
+    """
+
+    repository = models.CharField(max_length=255, unique=True)
+    owner = models.CharField(max_length=255)
+    expires = models.DateTimeField()
+
+    objects = RepositoryLeaseManager()
+
+    def __unicode__(self):
+        return "{} / {} / {}".format(self.repository, self.owner, self.expires)
+
+
+class PushedCommitManager(models.Manager):
+    def enqueue(self, repository, branch, commits):
+        """
+        Queue pushed commits for scanning, skipping any already queued.
+        Returns the number queued.
+        """
+
+        queued = set(self.filter(
+            repository=repository, commit__in=commits).values_list("commit", flat=True))
+        new = [c for c in OrderedDict.fromkeys(commits) if c not in queued]
+
+        try:
+            with transaction.atomic():
+                self.bulk_create(
+                    [PushedCommit(repository=repository, branch=branch, commit=c) for c in new])
+        except IntegrityError:
+            # the same commits were pushed to another branch at the same time
+            for commit in new:
+                self.get_or_create(
+                    repository=repository, commit=commit, defaults=dict(branch=branch))
+
+        return len(new)
+
+    def queued(self):
+        return self.filter(scanned=False)
+
+    def scanned_commits(self, repository):
+        """
+        Return the set of commits in repository the push worker has scanned
+        """
+
+        return set(self.filter(
+            repository=repository, scanned=True).values_list("commit", flat=True))
+
+    def delete_marked(self):
+        """
+        Delete scanned commits that a check has since marked as scanned,
+        returning the number deleted
+        """
+
+        scanned = list(self.filter(scanned=True).values_list("id", "repository", "commit"))
+        marked = set(Repository.objects.filter(
+            commit__in=[commit for _, _, commit in scanned]).values_list("repository", "commit"))
+        ids = [id_ for id_, repository, commit in scanned if (repository, commit) in marked]
+
+        return self.filter(id__in=ids).delete()[0]
+
+
+class PushedCommit(models.Model):
+    """
+    A commit reported by the push webhook, waiting to be scanned or, once
+    scanned, for a check to reach it.
+
+    The push worker doesn't mark the commits it scans, since a check stops
+    listing a branch at the first marked commit and the commits of a push
+    whose webhook was lost would never be listed.  Checks mark these commits
+    without scanning them again instead.
+    """
+
+    repository = models.CharField(max_length=255)
+    branch = models.CharField(max_length=255)
+    commit = models.CharField(max_length=255)
+    received = models.DateTimeField(auto_now_add=True)
+    scanned = models.BooleanField(default=False)
+
+    objects = PushedCommitManager()
+
+    def __unicode__(self):
+        return "{} / {} / {}".format(self.repository, self.branch, self.commit)
+
+    class Meta:
+        unique_together = (("repository", "commit"),)
+
+
+class OrgMemberPage(models.Model):
+    """
+    One page of the organisation's member list as last fetched, with the ETag
+    to ask GitHub whether it has changed since
+    """
+
+    page = models.PositiveIntegerField(unique=True)
+    etag = models.CharField(max_length=255, blank=True)
+    # newline separated
+    logins = models.TextField(blank=True)
+    fetched = models.DateTimeField()
+
+    def __unicode__(self):
+        return "{} / {}".format(self.page, self.fetched)
+
+
+# a line of an issue report, and each keyword (line number) listed on it,
+# reported_matches reads them back so the regexes must match the formats
+REPORT_LINE = "File: {} contains keywords: {}"
+REPORT_MATCH = "{} (line {})"
+REPORT_LINE_REGEX = re.compile("^File: (.*) contains keywords: (.*)$", re.M)
+REPORT_MATCH_REGEX = re.compile("(.+?) \\(line (\\d+)\\)(?:, |$)")
 
 
 class IssueManager(models.Manager):
+    def reported_matches(self):
+        """
+        Return the set of (repository, commit, filename, keyword, line number)
+        that issues have already been raised for, read back from the reports
+        """
+
+        reported = set()
+
+        for repository, commit, report in self.values_list("repository", "commit_hash", "report"):
+            for filename, keywords in REPORT_LINE_REGEX.findall(report):
+                for keyword, line_number in REPORT_MATCH_REGEX.findall(keywords):
+                    reported.add((repository, commit, filename, keyword, int(line_number)))
+
+        return reported
+
     def create_from_commit(self, commit, repository, matches, org_users):
 
+        files = OrderedDict()
+
+        for filename, keyword, line_number in matches:
+            files.setdefault(filename, []).append(
+                REPORT_MATCH.format(keyword, line_number))
+
         matches_text = "\n".join(
-            ["File: {} contains keywords: {}".format(
-                item[0],
-                ", ".join(item[1])) for item in matches]
+            [REPORT_LINE.format(
+                filename,
+                ", ".join(keywords)) for filename, keywords in files.items()]
         )
 
         if commit.author:
@@ -97,8 +585,8 @@ class IssueManager(models.Manager):
             report=matches_text
         )
 
-        if settings.NOTIFY_USER:
-            issue.notify_author()
+        if settings.NOTIFY_USER and email:
+            Notification.objects.enqueue(issue)
 
         return issue
 
@@ -149,14 +637,7 @@ class Issue(models.Model):
     def notify_author(self):
 
         if self.author_email:
-            context = dict(
-                issue=self,
-                host=settings.HOST)
-
-            message = render_to_string("email.txt", context=context)
-            send_mail(
-                settings.NOTIFY_EMAIL_SUBJECT, message,
-                settings.NOTIFY_EMAIL_FROM, [self.author_email])
+            get_notification_message(self.author_email, [self]).send()
 
     def mark_resolved(self, action_taken, comment):
 
@@ -169,3 +650,100 @@ class Issue(models.Model):
         self.author_response = comment
         self.save()
 
+
+
+def get_notification_message(email, issues):
+    """
+    Return the email telling an author about their issues, a digest of them
+    all if there is more than one
+    """
+
+    if len(issues) == 1:
+        subject = settings.NOTIFY_EMAIL_SUBJECT
+        body = render_to_string("email.txt", context=dict(issue=issues[0], host=settings.HOST))
+    else:
+        subject = settings.NOTIFY_DIGEST_SUBJECT.format(len(issues))
+        body = render_to_string(
+            "email_digest.txt", context=dict(issues=issues, host=settings.HOST))
+
+    return EmailMessage(subject, body, settings.NOTIFY_EMAIL_FROM, [email])
+
+
+class NotificationManager(models.Manager):
+    def enqueue(self, issue):
+        """
+        Queue an email to the issue's author, held for CHECKER_NOTIFY_DELAY
+        seconds so the rest of a burst of issues can join it in a digest
+        """
+
+        return self.create(
+            issue=issue, author_email=issue.author_email,
+            next_attempt=timezone.now() + datetime.timedelta(
+                seconds=settings.CHECKER_NOTIFY_DELAY))
+
+    def pending(self):
+        """
+        Notifications that will be sent or retried
+        """
+
+        return self.filter(attempts__lt=settings.CHECKER_NOTIFY_MAX_ATTEMPTS)
+
+    def due(self, held=False):
+        """
+        Notifications whose next attempt is due, and if held those still held
+        for CHECKER_NOTIFY_DELAY that haven't been attempted yet
+        """
+
+        due = Q(next_attempt__lte=timezone.now())
+
+        if held:
+            due |= Q(attempts=0)
+
+        return self.pending().filter(due)
+
+
+class Notification(models.Model):
+    """
+    An email to an issue's author waiting to be sent by a NotificationWorker
+    """
+
+    issue = models.ForeignKey(Issue, related_name="notifications", on_delete=models.CASCADE)
+    author_email = models.EmailField(max_length=255)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    objects = NotificationManager()
+
+    def claim(self):
+        """
+        Take the notification to send, counting the attempt and backing off
+        exponentially with some jitter so it is retried if the send fails or
+        never finishes.  Returns False if another worker took it first.
+        """
+
+        delay = min(
+            settings.CHECKER_NOTIFY_RETRY_BACKOFF * 2 ** self.attempts,
+            settings.CHECKER_RETRY_MAX_BACKOFF)
+        next_attempt = timezone.now() + datetime.timedelta(
+            seconds=delay * random.uniform(1, 1.5))
+
+        claimed = Notification.objects.filter(id=self.id, attempts=self.attempts).update(
+            attempts=self.attempts + 1, next_attempt=next_attempt)
+
+        if claimed:
+            self.attempts += 1
+            self.next_attempt = next_attempt
+
+        return bool(claimed)
+
+    def retry_later(self, error):
+        """
+        Record a failed send, it is retried when its claim backed off to
+        """
+
+        self.last_error = error
+        self.save(update_fields=["last_error"])
+
+    def __unicode__(self):
+        return "{} / {}".format(self.author_email, self.issue_id)
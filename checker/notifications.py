@@ -0,0 +1,137 @@
+import signal
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from .models import Notification, get_notification_message
+
+
+class NotificationWorker(object):
+    """
+    Send the emails queued by create_from_commit, so scanning never waits on
+    the mail server.
+
+    Due notifications are grouped by author, each author getting one digest
+    of all their issues, and up to CHECKER_NOTIFY_BATCH_SIZE emails are sent
+    over one SMTP connection at a time.  Emails that fail are retried with a
+    backoff, sent notifications are deleted.  Each notification is claimed
+    before it is sent, so the workers in several processes can run at once.
+    """
+
+    def __init__(self, logger, connection=None):
+        self.logger = logger
+        self.connection = connection or get_connection()
+        self.stopping = threading.Event()
+
+    def stop(self, signum=None, frame=None):
+        self.logger.info("Stopping once the current emails have been sent")
+        self.stopping.set()
+
+    def serve(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stopping.is_set():
+            if not self.send_batch():
+                self.stopping.wait(settings.CHECKER_NOTIFY_POLL_INTERVAL)
+
+    def drain(self, held=False):
+        """
+        Send every due notification, then return.  If held the notifications
+        still held for CHECKER_NOTIFY_DELAY are sent too, for when the scan
+        they were waiting on has finished.
+        """
+
+        while self.send_batch(held):
+            pass
+
+    def get_batch(self, held=False):
+        """
+        Return (email, notifications) for the authors with the oldest due
+        notifications, with all of each author's due notifications
+        """
+
+        due = Notification.objects.due(held)
+        emails = []
+
+        for email in due.order_by("next_attempt").values_list("author_email", flat=True):
+            if email not in emails:
+                emails.append(email)
+
+                if len(emails) == settings.CHECKER_NOTIFY_BATCH_SIZE:
+                    break
+
+        batch = OrderedDict((email, []) for email in emails)
+
+        for notification in due.filter(author_email__in=emails).select_related("issue").order_by("id"):
+            batch[notification.author_email].append(notification)
+
+        return list(batch.items())
+
+    def send_batch(self, held=False):
+        """
+        Send a batch of emails, returning how many were attempted
+        """
+
+        batch = self.get_batch(held)
+
+        if not batch:
+            return 0
+
+        sent = failed = 0
+
+        try:
+            for email, notifications in batch:
+                notifications = [n for n in notifications if n.claim()]
+
+                if not notifications:
+                    continue
+
+                message = get_notification_message(email, [n.issue for n in notifications])
+                message.connection = self.connection
+
+                try:
+                    # opens the connection unless it is already open, messages
+                    # go one at a time so a rejected address only holds back
+                    # its own notifications
+                    self.connection.open()
+                    self.connection.send_messages([message])
+                except Exception as e:
+                    self.logger.error("Email to {} failed: {!r}".format(email, e))
+                    failed += 1
+
+                    for notification in notifications:
+                        notification.retry_later(repr(e))
+
+                    # the server may have dropped the connection
+                    self.connection.close()
+                else:
+                    sent += 1
+                    Notification.objects.filter(id__in=[n.id for n in notifications]).delete()
+        finally:
+            self.connection.close()
+
+        self.logger.info("Sent {} emails, {} failed".format(sent, failed))
+
+        return len(batch)
+
+
+def send_queued_notifications(logger, held=True):
+    """
+    Send the queued notifications from the process that queued them, unless
+    a send_notifications worker has been deployed to do it
+    """
+
+    if settings.NOTIFY_USER and not settings.CHECKER_NOTIFY_WORKER:
+        NotificationWorker(logger).drain(held)
+
+
+def send_notifications(logger, once=False):
+    worker = NotificationWorker(logger)
+
+    if once:
+        worker.drain()
+    else:
+        worker.serve()
@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from .matcher import get_matcher
+from .patch import scan_patch, split_patch
+
+
+def scan_batch(keywords, items):
+    """
+    Scan a batch of (commit sha, filename, patch) work items in a worker
+    process, returning (commit sha, filename, keyword, line number) matches.
+    """
+
+    matcher = get_matcher(keywords)
+    matches = []
+
+    for sha, filename, patch in items:
+        for keyword, line_number in scan_patch(patch, matcher):
+            matches.append((sha, filename, keyword, line_number))
+
+    return matches
+
+
+def get_batches(items, size):
+    """
+    Group work items into batches of about size characters of patch, splitting
+    any patch bigger than that so one huge file can't hold up a worker.
+    """
+
+    batch, batch_size = [], 0
+
+    for sha, filename, patch in items:
+        for piece in split_patch(patch, size):
+            batch.append((sha, filename, piece))
+            batch_size += len(piece)
+
+            if batch_size >= size:
+                yield batch
+                batch, batch_size = [], 0
+
+    if batch:
+        yield batch
+
+
+class ParallelScanner(object):
+    """
+    Scan patches on a pool of worker processes.
+    """
+
+    def __init__(self, keywords, processes, chunk_size):
+        self.keywords = keywords
+        self.chunk_size = chunk_size
+        self._pool = ProcessPoolExecutor(max_workers=processes)
+
+    def scan(self, items):
+        """
+        Return the matches for (commit sha, filename, patch) work items, in
+        the same order as scanning them one after another in this process.
+        """
+
+        futures = [
+            self._pool.submit(scan_batch, self.keywords.keywords, batch)
+            for batch in get_batches(items, self.chunk_size)
+        ]
+
+        return [match for future in futures for match in future.result()]
+
+    def scan_files(self, commit, cache=None, file_filter=None, blobs=None):
+        """
+        Like checker.scan_files, but patches are scanned on the worker
+        processes.  File contents are streamed and scanned in this process.
+        """
+
+        files = [
+            f for f in commit.raw_data["files"]
+            if "patch" in f or blobs and blobs.wants(f)
+        ]
+
+        if file_filter:
+            files = file_filter.select(files)
+
+        found = [
+            blobs.scan_cached(f, self.keywords, cache) if "patch" not in f else
+            cache.get(f["patch"]) if cache else None
+            for f in files
+        ]
+
+        # work items are numbered by file so the results can be put back in order
+        items = [
+            (index, f["filename"], f["patch"])
+            for index, f in enumerate(files) if found[index] is None
+        ]
+
+        scanned = {index: [] for index, _, _ in items}
+
+        for index, _, keyword, line_number in self.scan(items):
+            scanned[index].append((keyword, line_number))
+
+        for index, matches in scanned.items():
+            found[index] = matches
+
+            if cache:
+                cache.set(files[index]["patch"], matches)
+
+        return [
+            (f["filename"], keyword, line_number)
+            for f, matches in zip(files, found) for keyword, line_number in matches
+        ]
+
+    def close(self):
+        self._pool.shutdown()
@@ -0,0 +1,175 @@
+import re
+
+from .matcher import KeywordMatcher, get_matcher
+
+
+HUNK_HEADER_REGEX = re.compile("@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
+# a header for a piece of a split hunk, only the new file line number matters
+SPLIT_HUNK_HEADER = "@@ -0,0 +{} @@\n"
+
+
+def added_lines(patch):
+    """
+    Yield (new file line number, start, end) for each line a unidiff adds,
+    where patch[start:end] is the line without its "+" prefix.  The patch
+    is walked in place, no line strings are built.
+    """
+
+    pos, length = 0, len(patch)
+    line_number = None
+
+    while pos < length:
+        end = patch.find("\n", pos)
+
+        if end == -1:
+            end = length
+
+        prefix = patch[pos]
+
+        if prefix == "@":
+            header = HUNK_HEADER_REGEX.match(patch, pos, end)
+            line_number = int(header.group(1)) if header else None
+        elif line_number is None:
+            pass
+        elif prefix == "+":
+            yield line_number, pos + 1, end
+            line_number += 1
+        elif prefix == " ":
+            line_number += 1
+
+        pos = end + 1
+
+
+def scan_patch(patch, keywords):
+    """
+    Return (keyword, line number) for each keyword found on an added line,
+    using the same boundary rules as search_text.
+    """
+
+    if not isinstance(keywords, KeywordMatcher):
+        keywords = get_matcher(keywords)
+
+    text = patch.lower()
+
+    # most patches contain no keywords at all, so check the whole patch once
+    # before looking at individual lines
+    candidates = keywords.find(text)
+
+    if not candidates:
+        return []
+
+    matches = []
+
+    for line_number, start, end in added_lines(text):
+        # the boundary either side of the line is the "+" prefix and newline
+        for index in sorted(keywords.find(text, start, end + 1, candidates)):
+            matches.append((keywords.keywords[index], line_number))
+
+    return matches
+
+
+def split_patch(patch, size):
+    """
+    Split patch at line boundaries into unidiffs of roughly size characters.
+
+    Pieces that start part way through a hunk get a hunk header carrying the
+    new file line number on, so scanning the pieces in order gives exactly
+    the same matches as scanning the whole patch.
+    """
+
+    pos, length = 0, len(patch)
+    line_number = None
+    header = ""
+
+    while pos < length:
+        end = patch.find("\n", min(pos + size, length) - 1)
+        end = length if end == -1 else end + 1
+
+        piece = patch[pos:end]
+
+        yield header + piece
+
+        # work out the new file line number at the start of the next piece
+        # from the last hunk header in this one and the lines after it
+        last_header = ("\n" + piece).rfind("\n@@")
+
+        if last_header != -1:
+            header_match = HUNK_HEADER_REGEX.match(piece, last_header)
+            line_end = piece.find("\n", last_header)
+
+            if header_match and line_end != -1:
+                line_number = int(header_match.group(1))
+                rest = piece[line_end:]
+            else:
+                line_number, rest = None, ""
+        else:
+            rest = "\n" + piece
+
+        if line_number is not None:
+            line_number += rest.count("\n+") + rest.count("\n ")
+            header = SPLIT_HUNK_HEADER.format(line_number)
+
+        pos = end
+
+
+def scan_chunks(chunks, keywords, max_line=64 * 1024, overlap=1024):
+    """
+    Return (keyword, line number) for each keyword found in text read a chunk
+    at a time, as if every line were added, using the same boundary rules as
+    scan_patch.
+
+    Only whole lines are scanned, the partial line at the end of a chunk is
+    carried over to the next, so a keyword spanning two chunks still matches.
+    A line longer than max_line is scanned in pieces overlapping by overlap
+    characters, which must be longer than any keyword match, so memory stays
+    bounded however the text is laid out.
+    """
+
+    if not isinstance(keywords, KeywordMatcher):
+        keywords = get_matcher(keywords)
+
+    matches, seen = [], set()
+
+    def scan(text, line_number):
+        # text[0] is the boundary before the first line, never scanned itself
+        candidates = keywords.find(text, 1)
+
+        pos, length = 1, len(text)
+
+        while candidates and pos < length:
+            end = text.find("\n", pos)
+
+            if end == -1:
+                end = length
+
+            for index in sorted(keywords.find(text, pos, end + 1, candidates)):
+                match = (keywords.keywords[index], line_number)
+
+                if match not in seen:
+                    seen.add(match)
+                    matches.append(match)
+
+            line_number += 1
+            pos = end + 1
+
+    line_number, carry = 1, "\n"
+
+    for chunk in chunks:
+        carry += chunk
+        last = carry.rfind("\n")
+
+        if last > 0:
+            scan(carry[:last + 1].lower(), line_number)
+            line_number += carry.count("\n", 1, last + 1)
+            carry = carry[last:]
+
+        if len(carry) > max_line:
+            # without a newline after it the end of the piece is never taken
+            # as a boundary, keywords cut off there match in the next piece
+            scan(carry.lower(), line_number)
+            carry = carry[-(overlap + 1):]
+
+    scan((carry + "\n").lower(), line_number)
+
+    return matches
@@ -0,0 +1,61 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Pipeline(object):
+    """
+    Fetch items on a bounded pool of worker threads, scan them on a single
+    scan thread (or one per scanning process when scanning is handed to a
+    process pool) and hand the results back in submission order.
+
+    The caller consuming run() is the writer stage: all database writes stay
+    on its thread, and because results come back in order the "already
+    scanned" markers are written newest commit first, exactly as in the
+    sequential loop.
+    """
+
+    def __init__(self, fetch, scan, workers, queue_size, scan_workers=1):
+        self.fetch = fetch
+        self.scan = scan
+        self.queue_size = max(queue_size, 1)
+
+        self._fetch_pool = ThreadPoolExecutor(max_workers=max(workers, 1))
+        self._scan_pool = ThreadPoolExecutor(max_workers=max(scan_workers, 1))
+        self._pending = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _scan(self, fetched):
+        return self.scan(fetched.result())
+
+    def run(self, items):
+        """
+        Yield (item, future) pairs, where future.result() returns the scan
+        result or raises whatever the fetch or scan stage raised.
+        """
+
+        for item in items:
+            fetched = self._fetch_pool.submit(self.fetch, item)
+            scanned = self._scan_pool.submit(self._scan, fetched)
+            self._pending.append((item, fetched, scanned))
+
+            if len(self._pending) >= self.queue_size:
+                item, _, scanned = self._pending.popleft()
+                yield item, scanned
+
+        while self._pending:
+            item, _, scanned = self._pending.popleft()
+            yield item, scanned
+
+    def close(self):
+        for _, fetched, scanned in self._pending:
+            fetched.cancel()
+            scanned.cancel()
+
+        self._pending.clear()
+        self._fetch_pool.shutdown()
+        self._scan_pool.shutdown()
@@ -0,0 +1,177 @@
+import hashlib
+import hmac
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .checker import get_blob_scanner, get_client, get_commit_fetcher, get_keywords, \
+    get_org_users, get_patch_store, scan_files
+from .models import Exclude, Repository, Issue, PushedCommit, PathFilter
+from .notifications import send_queued_notifications
+from .pipeline import Pipeline
+from .throttle import Throttle
+
+
+# the sha GitHub gives as "after" when a push deletes a branch
+NULL_SHA = "0" * 40
+BRANCH_PREFIX = "refs/heads/"
+
+
+def verify_signature(secret, body, headers):
+    """
+    Check a webhook body against its X-Hub-Signature-256 (or the older sha1
+    X-Hub-Signature) header, given as a dict of HTTP_ META names.
+    """
+
+    for header, digest in (("HTTP_X_HUB_SIGNATURE_256", hashlib.sha256),
+                           ("HTTP_X_HUB_SIGNATURE", hashlib.sha1)):
+        signature = headers.get(header)
+
+        if signature:
+            expected = "{}={}".format(
+                digest().name, hmac.new(secret.encode("utf-8"), body, digest).hexdigest())
+
+            return hmac.compare_digest(expected, signature)
+
+    return False
+
+
+def enqueue_push(payload):
+    """
+    Queue the commits of a push event for scanning, returning the number
+    queued.  Pushes to tags, deleted branches, excluded branches and private
+    or excluded repositories are ignored.
+    """
+
+    repository = payload["repository"]
+    ref = payload.get("ref", "")
+    branch = ref[len(BRANCH_PREFIX):]
+
+    if not ref.startswith(BRANCH_PREFIX) or payload.get("deleted") or \
+            payload.get("after") == NULL_SHA or repository.get("private"):
+        return 0
+
+    excludes = Exclude.objects.rules()
+
+    if excludes.excludes(repository["name"]) or \
+            excludes.excludes_branch(repository["name"], branch):
+        return 0
+
+    return PushedCommit.objects.enqueue(
+        repository["name"], branch, [commit["id"] for commit in payload.get("commits", [])])
+
+
+class PushWorker(object):
+    """
+    Scan the commits queued by the push webhook as they arrive.
+
+    Push payloads only name the files a commit changed, so each commit is
+    fetched from the API for its patches, a few at a time.  Scanned commits
+    are kept as PushedCommits rather than marked, so checks still list every
+    branch down to commits they have marked, picking up the commits of any
+    push whose webhook was lost, but don't fetch and scan these again.
+    Commits that can't be fetched are left to the next check.  Only one
+    worker should run at a time.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.client = get_client()
+        self.throttle = Throttle(
+            self.client,
+            min_interval=settings.GITHUB_QUERY_SLEEP_TIME,
+            reserve=settings.GITHUB_RATE_LIMIT_RESERVE)
+        self.org_users = get_org_users()
+        self.fetch_commit = get_commit_fetcher(self.client, self.throttle)
+        self.store = get_patch_store()
+        self.stopping = threading.Event()
+
+    def stop(self, signum=None, frame=None):
+        self.logger.info("Stopping once the current commits have been scanned")
+        self.stopping.set()
+
+    def serve(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        try:
+            while not self.stopping.is_set():
+                scanned = self.scan_batch()
+                send_queued_notifications(self.logger, held=False)
+
+                if not scanned:
+                    self.stopping.wait(settings.CHECKER_PUSH_POLL_INTERVAL)
+        finally:
+            if self.store:
+                self.store.close()
+
+    def scan_batch(self):
+        """
+        Scan the oldest queued commits, returning how many were taken off the
+        queue.
+        """
+
+        pushed = list(PushedCommit.objects.queued().order_by("id")[:settings.CHECKER_PUSH_BATCH_SIZE])
+
+        if not pushed:
+            PushedCommit.objects.delete_marked()
+            return 0
+
+        keywords = get_keywords()
+        file_filter = PathFilter.objects.file_filter()
+        blobs = get_blob_scanner()
+        scanned = set(Repository.objects.filter(
+            commit__in=[p.commit for p in pushed]).values_list("repository", "commit"))
+        queued = [p for p in pushed if (p.repository, p.commit) not in scanned]
+
+        def fetch(push):
+            return self.fetch_commit(push.repository, push.commit)
+
+        def scan(commit):
+            return commit, scan_files(
+                commit, keywords, file_filter=file_filter, blobs=blobs)
+
+        pipeline = Pipeline(
+            fetch, scan,
+            workers=settings.CHECKER_FETCH_WORKERS,
+            queue_size=settings.CHECKER_QUEUE_SIZE)
+
+        with pipeline:
+            for push, result in pipeline.run(queued):
+                try:
+                    commit, matches = result.result()
+                except Exception as e:
+                    self.logger.error("Scan of pushed commit {} {} failed: {!r}".format(
+                        push.repository, push.commit, e))
+                    push.delete()
+                    continue
+
+                if self.store:
+                    self.store.append(push.repository, commit, time.time(), keywords.keywords)
+
+                with transaction.atomic():
+                    if matches:
+                        self.logger.info("Found: {}".format(matches))
+                        Issue.objects.create_from_commit(
+                            commit, push.repository, matches, self.org_users)
+
+                    PushedCommit.objects.filter(id=push.id).update(scanned=True)
+
+        if self.store:
+            self.store.flush()
+
+        # commits a check has already marked
+        PushedCommit.objects.filter(
+            id__in=[p.id for p in pushed if p not in queued]).delete()
+
+        self.logger.info("Scanned {} pushed commits, {} already scanned".format(
+            len(queued), len(pushed) - len(queued)))
+
+        return len(pushed)
+
+
+def scan_pushes(logger):
+    PushWorker(logger).serve()
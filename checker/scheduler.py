@@ -0,0 +1,110 @@
+import heapq
+import time
+
+
+# a hit rate of one issue for every HIT_WEIGHT commits scanned halves a
+# repository's interval, two issues third it and so on
+HIT_WEIGHT = 100
+
+
+class Scheduler(object):
+    """
+    Decide when each repository should next be polled for new pushes.
+
+    A repository is polled again after an interval proportional to how long
+    ago it was last pushed to (age_factor of its age), so one pushed minutes
+    ago comes round every min_interval and one untouched for months every
+    max_interval.  Repositories whose commits have raised issues before come
+    round sooner.  Due repositories are kept on a heap, earliest first.
+    """
+
+    def __init__(self, min_interval, max_interval, age_factor, clock=time.time):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.age_factor = age_factor
+        self.clock = clock
+
+        self._heap = []
+        # the due time of each repository, heap entries that don't match it
+        # have been rescheduled since and are skipped
+        self._due = {}
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, name):
+        return name in self._due
+
+    def __iter__(self):
+        return iter(list(self._due))
+
+    def interval(self, pushed_at, hit_rate=0):
+        """
+        Return how long to wait before polling a repository last pushed to at
+        pushed_at (a timestamp, or None if never), with the given hit rate.
+        """
+
+        if pushed_at is None:
+            interval = self.max_interval
+        else:
+            age = max(self.clock() - pushed_at, 0)
+            interval = min(max(age * self.age_factor, self.min_interval), self.max_interval)
+
+        return max(interval / (1 + HIT_WEIGHT * hit_rate), self.min_interval)
+
+    def schedule(self, name, pushed_at=None, hit_rate=0, now=False):
+        """
+        Schedule the next poll of a repository, replacing any earlier one.  If
+        now is set the repository is due straight away, ahead of other due
+        repositories with longer intervals.
+        """
+
+        interval = self.interval(pushed_at, hit_rate)
+
+        if now:
+            due = self.clock() - (self.max_interval - interval)
+        else:
+            due = self.clock() + interval
+
+        self._due[name] = due
+        heapq.heappush(self._heap, (due, name))
+
+    def remove(self, name):
+        self._due.pop(name, None)
+
+    def pop(self):
+        """
+        Return the repository that is due soonest if it is due, otherwise
+        None.  It is not polled again until it is next scheduled.
+        """
+
+        while self._heap:
+            due, name = self._heap[0]
+
+            if self._due.get(name) != due:
+                heapq.heappop(self._heap)
+                continue
+
+            if due > self.clock():
+                return None
+
+            heapq.heappop(self._heap)
+            del self._due[name]
+
+            return name
+
+        return None
+
+    def wait_time(self):
+        """
+        Return how long until the next repository is due, or None if nothing
+        is scheduled.
+        """
+
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+        if not self._heap:
+            return None
+
+        return max(self._heap[0][0] - self.clock(), 0)
@@ -0,0 +1,137 @@
+import datetime
+import itertools
+import json
+import os
+import struct
+import uuid
+import zlib
+
+
+# named by creation time, so they sort oldest first, and by writer, since
+# every worker writes its own segments to the same directory
+SEGMENT_NAME = "{time:%Y%m%dT%H%M%S%f}-{pid}-{sequence:06d}-{uuid}.seg"
+
+# each record is its compressed length followed by the zlib compressed json
+RECORD_HEADER = struct.Struct(">I")
+
+# orders the segments opened in this process within the same microsecond
+_sequence = itertools.count(1)
+
+
+class StoredAuthor(object):
+    def __init__(self, login, email):
+        self.login = login
+        self.email = email
+
+
+class StoredCommit(object):
+    """
+    A commit read back from the store, shaped like the parts of a PyGithub
+    Commit that scan_files and Issue.objects.create_from_commit use.
+    """
+
+    def __init__(self, record):
+        self.sha = record["commit"]
+        self.html_url = record.get("url")
+        self.raw_data = {"files": record["files"]}
+
+        if record.get("author"):
+            self.author = StoredAuthor(record["author"], record.get("email"))
+        else:
+            self.author = None
+
+
+class PatchStore(object):
+    """
+    An append only store of every scanned commit's patches, so history can be
+    scanned again for new keywords without downloading it again.
+
+    Records are written to segment files named by time and writer, starting
+    a new segment for each store opened and once the current one reaches
+    segment_size bytes, so processes sharing the directory never write to
+    the same file.  A record cut short by a crash is ignored when reading.
+    """
+
+    def __init__(self, directory, segment_size):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._segment = None
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def segments(self):
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.endswith(".seg"))
+
+    def _open_segment(self):
+        # always start a new segment rather than appending to one that may end
+        # in a record cut short by a crash
+        path = os.path.join(self.directory, SEGMENT_NAME.format(
+            time=datetime.datetime.utcnow(), pid=os.getpid(), sequence=next(_sequence),
+            uuid=uuid.uuid4().hex[:8]))
+
+        return open(path, "ab")
+
+    def append(self, repository, commit, scanned, keywords=None):
+        """
+        Store the patches of a scanned commit, with the time it was scanned
+        and the keywords it was scanned for.
+        """
+
+        author = commit.author
+
+        record = dict(
+            repository=repository,
+            commit=commit.sha,
+            url=commit.html_url,
+            author=author.login if author else None,
+            email=author.email if author else None,
+            scanned=scanned,
+            keywords=list(keywords) if keywords is not None else None,
+            files=[
+                dict(filename=f["filename"], patch=f["patch"])
+                for f in commit.raw_data["files"] if "patch" in f
+            ],
+        )
+
+        data = zlib.compress(json.dumps(record).encode("utf-8"))
+
+        if self._segment is None or self._segment.tell() >= self.segment_size:
+            self.close()
+            self._segment = self._open_segment()
+
+        self._segment.write(RECORD_HEADER.pack(len(data)) + data)
+
+    def __iter__(self):
+        """
+        Yield every stored record, oldest first.
+        """
+
+        self.flush()
+
+        for path in self.segments():
+            with open(path, "rb") as segment:
+                while True:
+                    header = segment.read(RECORD_HEADER.size)
+
+                    if len(header) < RECORD_HEADER.size:
+                        break
+
+                    length, = RECORD_HEADER.unpack(header)
+                    data = segment.read(length)
+
+                    if len(data) < length:
+                        break
+
+                    yield json.loads(zlib.decompress(data).decode("utf-8"))
+
+    def flush(self):
+        if self._segment is not None:
+            self._segment.flush()
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
@@ -1,15 +1,57 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from unittest.mock import MagicMock, Mock
+from unittest.mock import MagicMock, Mock, call, patch
 import datetime as dt
+import hashlib
+import hmac
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+from ssl import SSLError
 
 from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.core import mail
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from github import Github
+from github.GithubException import GithubException
 
-from .models import Issue, Repository
-from .checker import process_patch
+from .models import Exclude, Issue, Repository, BranchHead, RepositoryPush, Keyword, Run, RunCursor, \
+    Failure, RepositoryLease, PushedCommit, OrgMemberPage, PathFilter, Notification
+from .checker import process_patch, search_text, scan_patch, scan_files, \
+    CheckRun, rescan_keywords, retry_failures, in_shard, get_branches, \
+    get_respositories
+from .matcher import KeywordMatcher, get_matcher, KEYWORD_SEARCH_REGEX
+from .members import OrgMembers
+from .cache import ScanCache
+from .checkpoint import Checkpoint
+from .daemon import CheckDaemon
+from .graphql import GraphQLDiscovery, GraphQLError
+from .httpcache import ConditionalRequestCache
+from .mirror import Mirror
+from .notifications import NotificationWorker, send_queued_notifications
+from .parallel import ParallelScanner
+from .patch import added_lines, split_patch, scan_chunks
+from .blobs import BlobScanner
+from .pipeline import Pipeline
+from .pushes import PushWorker
+from .scheduler import Scheduler
+from .store import PatchStore
+from .throttle import Throttle
+
+
+def get_org_members(*logins):
+    OrgMemberPage.objects.update_or_create(
+        page=1, defaults=dict(logins="\n".join(logins), fetched=timezone.now()))
+
+    return OrgMembers("token", "org", dt.timedelta(hours=1), session=Mock())
 
 
 class RepositoryTestCase(TestCase):
@@ -36,6 +78,249 @@ class RepositoryTestCase(TestCase):
         self.assertEquals(repo.repository, "test_repo")
 
 
+    def test_scanned_commits(self):
+        Repository.objects.create(repository="test_repo", commit="a")
+        Repository.objects.create(repository="test_repo", commit="b")
+        Repository.objects.create(repository="other_repo", commit="c")
+
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a", "b"})
+
+
+    def test_mark_scanned_skips_existing_markers(self):
+        Repository.objects.create(repository="test_repo", commit="a")
+
+        Repository.objects.mark_scanned([("test_repo", "a"), ("test_repo", "b")])
+
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a", "b"})
+
+
+class FailureTestCase(TestCase):
+
+    def retry(self, commit):
+        client = MagicMock()
+        client.get_repo.return_value.get_commit.side_effect = commit
+
+        with patch("checker.checker.Github", return_value=client), \
+                patch("checker.checker.get_org_users", return_value=[]), \
+                patch("checker.checker.Throttle") as throttle:
+            throttle.return_value.call.side_effect = lambda func, *args: func(*args)
+            retry_failures(Mock())
+
+    def test_due_excludes_backed_off_and_abandoned_failures(self):
+        due = Failure.objects.create(repository="test_repo", branch="master", commit="a")
+        Failure.objects.create(repository="test_repo", branch="master", commit="b",
+                               next_retry=dt.datetime.now() + dt.timedelta(hours=1))
+        Failure.objects.create(repository="test_repo", branch="master", commit="c",
+                               attempts=settings.CHECKER_RETRY_MAX_ATTEMPTS)
+
+        self.assertEquals(list(Failure.objects.due()), [due])
+        self.assertEquals(Failure.objects.pending().count(), 2)
+
+    def test_successful_retry_marks_commit_and_removes_failure(self):
+        Failure.objects.create(repository="test_repo", branch="master", commit="a")
+
+        self.retry(lambda sha: Mock(sha=sha, raw_data={"files": []}))
+
+        self.assertFalse(Failure.objects.exists())
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a"})
+
+    def test_commits_scanned_since_are_not_retried(self):
+        Failure.objects.create(repository="test_repo", branch="master", commit="a")
+        Failure.objects.create(repository="test_repo", branch="master", commit="b")
+        Repository.objects.mark_scanned([("test_repo", "a")])
+        PushedCommit.objects.enqueue("test_repo", "master", ["b"])
+        PushedCommit.objects.update(scanned=True)
+
+        self.retry(lambda sha: self.fail("fetched"))
+
+        self.assertFalse(Failure.objects.exists())
+
+    def test_retried_commits_are_stored(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        Failure.objects.create(repository="test_repo", branch="master", commit="a")
+
+        with self.settings(CHECKER_PATCH_STORE_DIR=directory):
+            self.retry(lambda sha: Mock(sha=sha, author=None, html_url="url", raw_data={"files": [
+                {"filename": "a.txt", "patch": "@@ -0,0 +1 @@\n+one"}]}))
+
+        self.assertEquals([r["commit"] for r in PatchStore(directory, 1024)], ["a"])
+
+    def test_failed_retry_backs_off(self):
+        Failure.objects.create(repository="test_repo", branch="master", commit="a")
+
+        self.retry(ValueError("boom"))
+
+        failure = Failure.objects.get()
+        self.assertEquals(failure.attempts, 1)
+        self.assertEquals(failure.last_error, "ValueError('boom')")
+        self.assertGreater(failure.next_retry, dt.datetime.now() +
+                           dt.timedelta(seconds=settings.CHECKER_RETRY_BACKOFF - 1))
+        self.assertFalse(Failure.objects.due().exists())
+
+
+class CheckpointTestCase(TestCase):
+
+    def test_flushes_when_batch_is_full(self):
+        checkpoint = Checkpoint(size=2, interval=60, clock=lambda: 0)
+
+        checkpoint.add("test_repo", "a")
+        self.assertEquals(Repository.objects.count(), 0)
+
+        checkpoint.add("test_repo", "b")
+        self.assertEquals(Repository.objects.count(), 2)
+        self.assertEquals(len(checkpoint), 0)
+
+    def test_flushes_after_interval(self):
+        now = [0]
+        checkpoint = Checkpoint(size=100, interval=10, clock=lambda: now[0])
+
+        checkpoint.add("test_repo", "a")
+        now[0] = 10
+        checkpoint.add("test_repo", "b")
+
+        self.assertEquals(Repository.objects.count(), 2)
+
+
+class RepositoryLeaseTestCase(TestCase):
+
+    def test_lease_is_held_until_released(self):
+        duration = dt.timedelta(minutes=10)
+
+        self.assertTrue(RepositoryLease.objects.acquire("test_repo", "one", duration))
+        self.assertTrue(RepositoryLease.objects.acquire("test_repo", "one", duration))
+        self.assertFalse(RepositoryLease.objects.acquire("test_repo", "two", duration))
+
+        RepositoryLease.objects.release("test_repo", "one")
+
+        self.assertTrue(RepositoryLease.objects.acquire("test_repo", "two", duration))
+
+    def test_expired_lease_can_be_taken(self):
+        RepositoryLease.objects.acquire("test_repo", "one", dt.timedelta(minutes=-1))
+
+        self.assertTrue(RepositoryLease.objects.acquire(
+            "test_repo", "two", dt.timedelta(minutes=10)))
+        self.assertEquals(RepositoryLease.objects.get().owner, "two")
+
+    def test_shards_partition_repositories(self):
+        names = ["repo{}".format(i) for i in range(50)]
+        shards = [[name for name in names if in_shard(name, (i, 3))] for i in range(3)]
+
+        self.assertEquals(sorted(sum(shards, [])), sorted(names))
+
+
+class ExcludeTestCase(TestCase):
+
+    def test_repositories_are_excluded_by_name_glob_and_regex(self):
+        Exclude.objects.create(repository="legacy")
+        Exclude.objects.create(repository="*-archive", match="glob")
+        Exclude.objects.create(repository="tmp-[0-9]+", match="regex")
+        rules = Exclude.objects.rules()
+
+        self.assertTrue(rules.excludes("legacy"))
+        self.assertTrue(rules.excludes("site-archive"))
+        self.assertTrue(rules.excludes("tmp-12"))
+        self.assertFalse(rules.excludes("legacy-app"))
+        self.assertFalse(rules.excludes("tmp-12a"))
+
+    def test_branches_are_excluded_per_repository(self):
+        Exclude.objects.create(repository="*", branch="gh-pages", match="glob")
+        Exclude.objects.create(repository="docs", branch="draft/*", match="glob")
+        rules = Exclude.objects.rules()
+
+        self.assertFalse(rules.excludes("docs"))
+        self.assertTrue(rules.excludes_branch("app", "gh-pages"))
+        self.assertTrue(rules.excludes_branch("docs", "draft/intro"))
+        self.assertFalse(rules.excludes_branch("app", "draft/intro"))
+        self.assertFalse(rules.excludes_branch("docs", "master"))
+
+    def test_excluded_repositories_are_dropped_from_listing(self):
+        Exclude.objects.create(repository="*-archive", match="glob")
+        repos = [Mock(private=False), Mock(private=False)]
+        repos[0].name, repos[1].name = "app", "app-archive"
+        client = Mock()
+        client.get_organization.return_value.get_repos.return_value = repos
+
+        self.assertEquals([r.name for r in get_respositories(client)], ["app"])
+
+    def test_invalid_regex_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            Exclude(repository="tmp-(", match="regex").full_clean()
+
+
+class PathFilterTestCase(TestCase):
+
+    def get_commit(self, *files):
+        return Mock(raw_data={"files": [
+            dict(filename=filename, changes=changes, patch="@@ -0,0 +1 @@\n+ secret ")
+            for filename, changes in files]})
+
+    def test_default_filters_skip_vendored_and_minified_files(self):
+        file_filter = PathFilter.objects.file_filter()
+        commit = self.get_commit(
+            ("app.js", 1), ("static/app.min.js", 1), ("web/node_modules/x/index.js", 1),
+            ("package-lock.json", 1), ("Gemfile.lock", 1))
+
+        matches = scan_files(commit, get_matcher(["secret"]), file_filter=file_filter)
+
+        self.assertEquals(matches, [("app.js", "secret", 1)])
+        self.assertEquals(file_filter.stats["files skipped by path"], 4)
+        self.assertEquals(file_filter.stats["patch bytes skipped"], 4 * len(
+            commit.raw_data["files"][0]["patch"]))
+
+    def test_include_overrides_exclude(self):
+        PathFilter.objects.create(pattern="vendor/config/*", action="include")
+        file_filter = PathFilter.objects.file_filter()
+
+        self.assertTrue(file_filter.skip("vendor/lib/a.py"))
+        self.assertFalse(file_filter.skip("vendor/config/settings.py"))
+
+    @override_settings(CHECKER_MAX_FILE_CHANGES=100, CHECKER_MAX_PATCH_SIZE=10)
+    def test_oversized_files_are_skipped(self):
+        file_filter = PathFilter.objects.file_filter()
+
+        self.assertEquals(file_filter.skip_reason("data.csv", changes=101), "changes")
+        self.assertEquals(file_filter.skip_reason("data.csv", 1, "x" * 11), "size")
+        self.assertIsNone(file_filter.skip_reason("data.csv", 1, "x" * 10))
+
+
+class OrgMembersTestCase(TestCase):
+
+    def get_response(self, status_code=200, logins=(), etag=None):
+        return Mock(status_code=status_code, headers={"ETag": etag},
+                    json=Mock(return_value=[{"login": login} for login in logins]))
+
+    def test_members_are_refreshed_with_conditional_requests(self):
+        first_page = ["user{}".format(i) for i in range(100)]
+        session = Mock()
+        session.get.side_effect = [
+            self.get_response(logins=first_page, etag="1"),
+            self.get_response(logins=["last"], etag="2"),
+        ]
+        members = OrgMembers("token", "org", dt.timedelta(hours=1), session=session)
+
+        self.assertIn("last", members)
+        self.assertNotIn("someone", members)
+        self.assertEquals(len(members), 101)
+        self.assertEquals(members.refreshes, 1)
+
+        OrgMemberPage.objects.update(fetched=timezone.now() - dt.timedelta(hours=2))
+        session.get.side_effect = [self.get_response(304), self.get_response(200, [], "3")]
+        members = OrgMembers("token", "org", dt.timedelta(hours=1), session=session)
+
+        self.assertIn("user0", members)
+        self.assertNotIn("last", members)
+        self.assertEquals(session.get.call_args_list[2][1]["headers"]["If-None-Match"], "1")
+        self.assertEquals((members.pages_unchanged, members.pages_fetched), (1, 1))
+
+    def test_fresh_members_are_not_fetched(self):
+        members = get_org_members("github-user")
+
+        self.assertIn("github-user", members)
+        self.assertFalse(members.session.get.called)
+        self.assertEquals((members.hits, members.refreshes), (1, 0))
+
+
 class ModelsTestCase(TestCase):
     def test_issue_notify_author(self):
         issue = Issue(author_email="test@test.com")
@@ -56,7 +341,7 @@ class ModelsTestCase(TestCase):
 
     def test_create_from_commit(self):
         Issue.objects.create_from_commit(self.get_mock_commit(), "test_repo",
-                                         [["somefile.txt", ["some matches"]]])
+                                         [["somefile.txt", "some matches", 1]])
 
         issue = Issue.objects.first()
 
@@ -147,6 +432,19 @@ class CheckerTestCase(TestCase):
         with self.assertRaises(Exception):
             process_patch("this is not a patch file")
 
+    def test_added_lines_have_new_file_line_numbers(self):
+        patch = "@@ -1,3 +1,4 @@\n context\n-removed\n+added\n+\n context\n@@ -20 +21,2 @@\n+later\n\\ No newline at end of file"
+
+        lines = [(number, patch[start:end]) for number, start, end in added_lines(patch)]
+
+        self.assertEquals(lines, [(2, "added"), (3, ""), (21, "later")])
+
+    def test_scan_patch_ignores_removed_lines(self):
+        patch = "@@ -1,2 +1,2 @@\n-password = 1\n+token = 1\n secret\n+ Password=2"
+
+        self.assertEquals(scan_patch(patch, ["password", "secret", "token"]),
+                          [("token", 1), ("password", 3)])
+
     def test_keyword_searching(self):
 
         keyword = "defence"
@@ -165,6 +463,1075 @@ class CheckerTestCase(TestCase):
             "*defencez"
         ]
 
+
+
+class KeywordMatcherTestCase(TestCase):
+
+    def legacy_search(self, text, keywords):
+        return [k for k in keywords
+                if re.search(KEYWORD_SEARCH_REGEX.format(keyword=k), text.lower(), re.I)]
+
+    def test_matches_legacy_search(self):
+        keywords = ["defence", "def", "secret key", "key", "password", "pass", "defence"]
+        texts = [
+            " defence ",
+            "+defence_key = 'x'\n+secret key: value\n",
+            "(key)(password) pass.",
+            "defence",
+            "1234defence123 *def* secret keys",
+            " secret key pass ",
+        ]
+
+        matcher = KeywordMatcher(keywords)
+
+        for text in texts:
+            self.assertEquals(matcher.search(text), self.legacy_search(text, keywords))
+
+    def test_overlapping_keywords_are_all_found(self):
+        matcher = KeywordMatcher(["a b", "b c"])
+
+        self.assertEquals(matcher.search(" a b c "), ["a b", "b c"])
+
+    def test_search_text_accepts_keyword_list(self):
+        self.assertEquals(search_text(" DEFENCE ", ["defence"]), ["defence"])
+
+    def test_get_matcher_only_rebuilds_on_change(self):
+        matcher = get_matcher(["one", "two"])
+
+        self.assertIs(get_matcher(["one", "two"]), matcher)
+        self.assertIsNot(get_matcher(["one", "three"]), matcher)
+        self.assertNotEquals(get_matcher(["one", "three"]).version, matcher.version)
+
+class BlobScannerTestCase(TestCase):
+
+    def get_scanner(self, content, chunk_size=8):
+        session = Mock()
+        session.get.return_value.iter_content.side_effect = lambda size: [
+            content[i:i + size] for i in range(0, len(content), size)]
+
+        return BlobScanner("token", chunk_size, overlap=8, max_size=1000, session=session)
+
+    def test_keywords_across_chunk_boundaries_match(self):
+        text = "x = 1\npassword = 'a'\n" + "y" * 30 + " token\nsecretive\n é secret"
+        keywords = get_matcher(["password", "token", "secret"])
+        expected = [("password", 2), ("token", 3), ("secret", 5)]
+
+        self.assertEquals(scan_chunks([text], keywords), expected)
+
+        for size in range(1, 12):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+
+            self.assertEquals(scan_chunks(chunks, keywords, max_line=10, overlap=8), expected)
+
+    def test_file_content_is_streamed_and_scanned(self):
+        scanner = self.get_scanner("a = 1\nsecret = 2\n\u00e9\u00e9 secret".encode("utf-8"))
+        file_ = {"filename": "big.py", "status": "added", "raw_url": "url", "sha": "abc"}
+        commit = Mock(raw_data={"files": [file_]})
+
+        self.assertTrue(scanner.wants(file_))
+        self.assertEquals(scan_files(commit, ["secret"], blobs=scanner),
+                          [("big.py", "secret", 2), ("big.py", "secret", 3)])
+
+    def test_binary_files_are_skipped(self):
+        scanner = self.get_scanner(b"\x89PNG\0 secret ", chunk_size=1024)
+
+        self.assertEquals(scanner.scan({"raw_url": "url"}, ["secret"]), [])
+        self.assertFalse(scanner.wants({"filename": "logo.png", "raw_url": "url"}))
+        self.assertFalse(scanner.wants({"filename": "a.py", "status": "removed", "raw_url": "url"}))
+
+    def test_renames_and_mode_changes_are_skipped(self):
+        scanner = self.get_scanner(b"secret = 1\n")
+        renamed = {"filename": "new.py", "previous_filename": "old.py", "status": "renamed",
+                   "additions": 0, "deletions": 0, "changes": 0, "raw_url": "url"}
+        mode_change = {"filename": "run.sh", "status": "modified", "changes": 0, "raw_url": "url"}
+        commit = Mock(raw_data={"files": [renamed, mode_change]})
+
+        self.assertFalse(scanner.wants(renamed))
+        self.assertFalse(scanner.wants(mode_change))
+        self.assertEquals(scan_files(commit, ["secret"], blobs=scanner), [])
+        self.assertFalse(scanner.session.get.called)
+
+
+class ParallelScannerTestCase(TestCase):
+
+    patch = "\n".join(
+        ["@@ -1,40 +1,60 @@"] +
+        ["+line {} secret".format(i) if i % 3 else " context {}".format(i) for i in range(60)] +
+        ["-password removed", "@@ -100 +120,5 @@"] +
+        ["+password = {}".format(i) for i in range(5)])
+
+    def test_split_patch_keeps_line_numbers(self):
+        expected = scan_patch(self.patch, ["secret", "password"])
+
+        for size in (10, 50, 200, len(self.patch)):
+            pieces = list(split_patch(self.patch, size))
+            matches = [m for piece in pieces for m in scan_patch(piece, ["secret", "password"])]
+
+            self.assertEquals(matches, expected)
+
+    def test_results_match_single_process_scan(self):
+        keywords = get_matcher(["secret", "password"])
+        commit = Mock(sha="a", raw_data={"files": [
+            {"filename": "one.txt", "patch": self.patch},
+            {"filename": "binary.bin"},
+            {"filename": "two.txt", "patch": "@@ -0,0 +1 @@\n+ secret "},
+        ]})
+
+        scanner = ParallelScanner(keywords, processes=2, chunk_size=100)
+        self.addCleanup(scanner.close)
+
+        self.assertEquals(scanner.scan_files(commit), scan_files(commit, keywords))
+
+        cache = ScanCache(keywords.version, max_bytes=1000)
+        self.assertEquals(scanner.scan_files(commit, cache=cache), scan_files(commit, keywords))
+        self.assertEquals(scanner.scan_files(commit, cache=cache), scan_files(commit, keywords))
+        self.assertEquals(cache.hits, 2)
+
+
+class ScanCacheTestCase(TestCase):
+
+    def test_least_recently_used_entries_are_evicted(self):
+        # room for two entries of a 40 character key and short matches
+        cache = ScanCache("v1", max_bytes=120)
+        cache.set("a", [])
+        cache.set("b", [("secret", 1)])
+        cache.get("a")
+        cache.set("c", [])
+
+        self.assertEquals(cache.get("a"), [])
+        self.assertIsNone(cache.get("b"))
+        self.assertEquals((cache.hits, cache.misses), (2, 1))
+
+    def test_disk_tier_is_invalidated_by_keyword_change(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "cache")
+
+        cache = ScanCache("v1", max_bytes=1000, path=path)
+        cache.set("patch", [("secret", 1)])
+        cache.close()
+
+        cache = ScanCache("v1", max_bytes=1000, path=path)
+        self.assertEquals(cache.get("patch"), [("secret", 1)])
+        cache.close()
+
+        cache = ScanCache("v2", max_bytes=1000, path=path)
+        self.assertIsNone(cache.get("patch"))
+        cache.close()
+
+    def test_disk_tier_is_bounded_by_size(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "cache")
+
+        cache = ScanCache("v1", max_bytes=1000, path=path, disk_bytes=100)
+
+        for i in range(20):
+            cache.set("patch {}".format(i), [("secret", i)])
+
+        self.assertLessEqual(cache._disk.size(), 100)
+        cache.close()
+
+        # shared with another process's cache
+        cache = ScanCache("v1", max_bytes=1000, path=path, disk_bytes=100)
+        self.assertEquals(cache.get("patch 19"), [("secret", 19)])
+        self.assertIsNone(cache.get("patch 0"))
+        cache.close()
+
+    def test_scan_files_uses_cache(self):
+        keywords = get_matcher(["secret"])
+        cache = ScanCache(keywords.version, max_bytes=1000)
+        commit = Mock(raw_data={"files": [
+            {"filename": "a.txt", "patch": "@@ -0,0 +1 @@\n+ secret "},
+            {"filename": "b.txt", "patch": "@@ -0,0 +1 @@\n+ secret "},
+        ]})
+
+        self.assertEquals(scan_files(commit, keywords, cache=cache),
+                          [("a.txt", "secret", 1), ("b.txt", "secret", 1)])
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+
+class ConditionalRequestCacheTestCase(TestCase):
+
+    def get_connection(self, cache, responses):
+        requests = []
+
+        class Connection(object):
+            def __init__(self, host, port=None, **kwargs):
+                pass
+
+            def request(self, verb, url, body=None, headers=None):
+                requests.append((url, headers))
+
+            def getresponse(self):
+                return responses.pop(0)
+
+        return cache.connection_class(Connection)("api.github.com"), requests
+
+    def get_response(self, status, body=b"", headers=()):
+        return Mock(status=status, read=Mock(return_value=body),
+                    getheaders=Mock(return_value=list(headers)))
+
+    def test_unchanged_response_is_served_from_cache(self):
+        cache = ConditionalRequestCache(10)
+        connection, requests = self.get_connection(cache, [
+            self.get_response(200, b"[1, 2]", [("ETag", "abc"), ("Link", "next")]),
+            self.get_response(304, headers=[("ETag", "abc"), ("X-RateLimit-Remaining", "9")]),
+        ])
+
+        connection.request("GET", "/orgs/org/repos?page=2", None, {"Authorization": "token"})
+        self.assertEquals(connection.getresponse().read(), b"[1, 2]")
+
+        connection.request("GET", "/orgs/org/repos?page=2", None, {"Authorization": "token"})
+        response = connection.getresponse()
+
+        self.assertEquals(requests[1][1]["If-None-Match"], "abc")
+        self.assertEquals((response.status, response.read()), (200, b"[1, 2]"))
+        self.assertEquals(dict(response.getheaders())["link"], "next")
+        self.assertEquals(dict(response.getheaders())["x-ratelimit-remaining"], "9")
+        self.assertEquals(cache.stats, {"hits": 1, "misses": 1, "bytes saved": 6})
+
+    def test_disk_tier_is_shared_and_bounded(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "http")
+        caches = [ConditionalRequestCache(10, path=path, max_bytes=1000) for _ in range(2)]
+
+        caches[0].set("a", dict(etag="abc", body="x" * 600))
+        self.assertEquals(caches[1].get("a")["etag"], "abc")
+
+        caches[1].set("b", dict(etag="def", body="y" * 600))
+        self.assertIsNone(caches[0].get("a"))
+
+        for cache in caches:
+            cache.close()
+
+    def test_commits_are_not_cached(self):
+        cache = ConditionalRequestCache(10)
+        response = self.get_response(200, b"{}", [("ETag", "abc")])
+        connection, requests = self.get_connection(cache, [response])
+
+        connection.request("GET", "/repos/org/repo/commits/abc", None, {})
+
+        self.assertIs(connection.getresponse(), response)
+        self.assertEquals(cache.stats, {})
+
+
+class GraphQLDiscoveryTestCase(TestCase):
+
+    def get_discovery(self, *fixtures):
+        responses = []
+
+        for fixture in fixtures:
+            path = os.path.join(os.path.dirname(__file__), "test_data", "graphql", fixture)
+
+            with open(path) as f:
+                responses.append(Mock(json=Mock(return_value=json.load(f))))
+
+        client = Mock()
+        session = Mock()
+        session.post.side_effect = responses
+
+        return GraphQLDiscovery(client, "token", "uktrade", session=session)
+
+    def test_repositories_are_listed_with_branch_heads(self):
+        discovery = self.get_discovery(
+            "repositories_1.json", "refs.json", "repositories_2.json")
+
+        repos = list(discovery.repositories())
+
+        self.assertEquals([r.name for r in repos], ["alpha", "beta", "gamma"])
+        self.assertEquals(discovery.requests, 3)
+
+        alpha = repos[0]
+        self.assertEquals((alpha.private, alpha.default_branch), (False, "master"))
+        self.assertEquals(alpha.pushed_at, dt.datetime(2017, 8, 16, 14, 5, 12))
+        self.assertEquals(
+            [(b.name, b.commit.sha[:7]) for b in get_branches(alpha)],
+            [("master", "c3b4f4a"), ("feature", "8b1a995"), ("release", "e83c516")])
+        self.assertTrue(repos[1].private)
+        self.assertEquals((repos[2].pushed_at, repos[2].get_branches()), (None, []))
+
+        refs_query = discovery.session.post.call_args_list[1][1]["json"]["query"]
+        self.assertIn('repository(owner: "uktrade", name: "alpha")', refs_query)
+        self.assertIn('after: "Mg"', refs_query)
+
+    def test_other_calls_use_a_rest_repository_built_without_fetching(self):
+        alpha = next(self.get_discovery("repositories_1.json", "refs.json").repositories())
+        alpha._client = Github("token")
+
+        with patch("github.Requester.Requester.requestJsonAndCheck") as request:
+            self.assertEquals(alpha.full_name, "uktrade/alpha")
+            alpha.get_commits(sha="master")
+
+        self.assertFalse(request.called)
+        self.assertEquals(alpha._repo.url, "https://api.github.com/repos/uktrade/alpha")
+
+    def test_errors_are_raised(self):
+        with self.assertRaises(GraphQLError):
+            list(self.get_discovery("error.json").repositories())
+
+    def test_unknown_organisation_is_an_error(self):
+        discovery = self.get_discovery()
+        discovery.session.post.side_effect = [
+            Mock(json=Mock(return_value={"data": {"organization": None}}))]
+
+        with self.assertRaisesRegex(GraphQLError, "uktrade not found"):
+            list(discovery.repositories())
+
+    def test_rate_limited_queries_go_through_the_throttle(self):
+        discovery = self.get_discovery("repositories_2.json")
+        limited = Mock(status_code=403, headers={"Retry-After": "1"},
+                       json=Mock(return_value={"message": "secondary rate limit"}))
+        discovery.session.post.side_effect = [limited] + list(discovery.session.post.side_effect)
+        client = Mock(rate_limiting=(100, 5000), rate_limiting_resettime=0)
+        discovery.throttle = Throttle(client, clock=lambda: 0, sleep=Mock())
+
+        self.assertEquals([r.name for r in discovery.repositories()], ["gamma"])
+        self.assertEquals(discovery.throttle.sleep.call_count, 3)
+
+
+class PatchStoreTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def get_commit(self, sha, patch):
+        return Mock(sha=sha, html_url="url", author=Mock(login="github-user", email="email"),
+                    raw_data={"files": [{"filename": "a.txt", "patch": patch}, {"filename": "b.bin"}]})
+
+    def test_records_are_read_back_in_order(self):
+        store = PatchStore(self.directory, segment_size=10)
+        store.append("test_repo", self.get_commit("a", "@@ -0,0 +1 @@\n+one"), 1)
+        store.append("test_repo", self.get_commit("b", "@@ -0,0 +1 @@\n+two"), 2)
+        store.close()
+
+        records = list(PatchStore(self.directory, segment_size=10))
+
+        self.assertEquals([r["commit"] for r in records], ["a", "b"])
+        self.assertEquals(records[0]["files"], [{"filename": "a.txt", "patch": "@@ -0,0 +1 @@\n+one"}])
+        self.assertEquals(len(store.segments()), 2)
+
+    def test_stores_sharing_a_directory_write_their_own_segments(self):
+        stores = [PatchStore(self.directory, segment_size=1024) for _ in range(2)]
+        stores[0].append("test_repo", self.get_commit("a", "@@ -0,0 +1 @@\n+one"), 1)
+        stores[1].append("test_repo", self.get_commit("b", "@@ -0,0 +1 @@\n+two"), 2)
+        stores[0].append("test_repo", self.get_commit("c", "@@ -0,0 +1 @@\n+three"), 3)
+
+        for store in stores:
+            store.close()
+
+        self.assertEquals(len(stores[0].segments()), 2)
+        self.assertEquals([r["commit"] for r in stores[0]], ["a", "c", "b"])
+
+    def test_reported_matches_read_back_issue_reports(self):
+        matches = [("a.txt", "secret", 1), ("a.txt", "api key", 12), ("dir/b (1).txt", "token", 3)]
+        Issue.objects.create_from_commit(
+            Mock(sha="abc", html_url="url", author=None), "test_repo", matches, [])
+
+        self.assertEquals(Issue.objects.reported_matches(),
+                          set(("test_repo", "abc") + m for m in matches))
+
+    def test_truncated_record_is_ignored(self):
+        store = PatchStore(self.directory, segment_size=1024)
+        store.append("test_repo", self.get_commit("a", "@@ -0,0 +1 @@\n+one"), 1)
+        store.close()
+
+        with open(store.segments()[0], "ab") as segment:
+            segment.write(b"\x00\x00\x01\x00partial")
+
+        self.assertEquals([r["commit"] for r in store], ["a"])
+
+    def test_rescan_only_reports_new_keywords_for_older_commits(self):
+        with self.settings(CHECKER_PATCH_STORE_DIR=self.directory):
+            store = PatchStore(self.directory, segment_size=1024)
+            store.append("test_repo", self.get_commit("old", "@@ -0,0 +1 @@\n+ token secret "), 0)
+            store.append("test_repo", self.get_commit("new", "@@ -0,0 +1 @@\n+ token "), time.time() + 60)
+            store.close()
+
+            Keyword.objects.create(text="secret", history_scanned=True)
+            Keyword.objects.create(text="token")
+
+            with patch("checker.checker.Github"), \
+                    patch("checker.checker.get_org_users", return_value=["github-user"]):
+                rescan_keywords(Mock())
+
+        issue = Issue.objects.get()
+        self.assertEquals(issue.commit_hash, "old")
+        self.assertEquals(issue.report, "File: a.txt contains keywords: token (line 1)")
+        self.assertFalse(Keyword.objects.filter(history_scanned=False).exists())
+
+    def test_rescan_uses_stored_keywords_and_skips_reported_matches(self):
+        with self.settings(CHECKER_PATCH_STORE_DIR=self.directory):
+            # scanned after the keyword was added, by a run started before it
+            store = PatchStore(self.directory, segment_size=1024)
+            store.append("test_repo", self.get_commit("a", "@@ -0,0 +1 @@\n+ token "),
+                         time.time() + 60, ["secret"])
+            store.append("test_repo", self.get_commit("b", "@@ -0,0 +1 @@\n+ token "),
+                         time.time() + 60, ["secret", "token"])
+            store.close()
+
+            keyword = Keyword.objects.create(text="token")
+
+            with patch("checker.checker.Github"), \
+                    patch("checker.checker.get_org_users", return_value=["github-user"]):
+                rescan_keywords(Mock())
+
+                # as if the first rescan had been cut short
+                keyword.history_scanned = False
+                keyword.save()
+                rescan_keywords(Mock())
+
+        self.assertEquals(list(Issue.objects.values_list("commit_hash", flat=True)), ["a"])
+
+
+class PipelineTestCase(TestCase):
+
+    def test_results_are_returned_in_order(self):
+        def fetch(item):
+            time.sleep(0.01 * (5 - item))
+            return item
+
+        with Pipeline(fetch, lambda item: item * 2, workers=4, queue_size=2) as pipeline:
+            results = [(item, result.result()) for item, result in pipeline.run(range(5))]
+
+        self.assertEquals(results, [(i, i * 2) for i in range(5)])
+
+    def test_fetch_errors_are_raised_to_the_writer(self):
+        def fetch(item):
+            raise ValueError(item)
+
+        with Pipeline(fetch, lambda item: item, workers=2, queue_size=2) as pipeline:
+            for item, result in pipeline.run([1]):
+                with self.assertRaises(ValueError):
+                    result.result()
+
+class SchedulerTestCase(TestCase):
+
+    def get_scheduler(self, now):
+        return Scheduler(min_interval=60, max_interval=3600, age_factor=0.1,
+                         clock=lambda: now[0])
+
+    def test_recently_pushed_repositories_are_polled_sooner(self):
+        now = [100000]
+        scheduler = self.get_scheduler(now)
+
+        self.assertEquals(scheduler.interval(now[0] - 10), 60)
+        self.assertEquals(scheduler.interval(now[0] - 10000), 1000)
+        self.assertEquals(scheduler.interval(now[0] - 100000), 3600)
+        self.assertEquals(scheduler.interval(now[0] - 10000, hit_rate=0.01), 500)
+
+    def test_pop_returns_due_repositories_in_order(self):
+        now = [100000]
+        scheduler = self.get_scheduler(now)
+        scheduler.schedule("cold", now[0] - 100000)
+        scheduler.schedule("hot", now[0] - 10)
+
+        self.assertIsNone(scheduler.pop())
+        self.assertEquals(scheduler.wait_time(), 60)
+
+        now[0] += 3600
+        self.assertEquals([scheduler.pop(), scheduler.pop(), scheduler.pop()],
+                          ["hot", "cold", None])
+
+    def test_pushed_repositories_are_due_now_hottest_first(self):
+        now = [100000]
+        scheduler = self.get_scheduler(now)
+        scheduler.schedule("cold", now[0] - 100000, now=True)
+        scheduler.schedule("warm", now[0] - 10000, now=True)
+        scheduler.schedule("hot", now[0] - 10, now=True)
+        scheduler.schedule("warm", now[0] - 10000)
+
+        self.assertEquals([scheduler.pop(), scheduler.pop(), scheduler.pop()],
+                          ["hot", "cold", None])
+
+
+class ThrottleTestCase(TestCase):
+
+    def get_throttle(self, remaining, reset=1000, **kwargs):
+        client = Mock(rate_limiting=(remaining, 5000), rate_limiting_resettime=reset)
+        return Throttle(client, clock=lambda: 0, sleep=Mock(), **kwargs)
+
+    def test_spreads_remaining_budget_until_reset(self):
+        throttle = self.get_throttle(100)
+
+        self.assertEquals(throttle.delay(), 0)
+        self.assertEquals(throttle.delay(), 10)
+        self.assertEquals(throttle.delay(), 20)
+
+    def test_waits_for_reset_when_budget_is_spent(self):
+        throttle = self.get_throttle(10, reserve=10)
+
+        self.assertEquals(throttle.delay(), 1000)
+
+    def test_backs_off_and_retries_on_403(self):
+        throttle = self.get_throttle(100)
+        func = Mock(side_effect=[GithubException(403, "abuse"), "ok"])
+
+        self.assertEquals(throttle.call(func), "ok")
+        self.assertEquals(func.call_count, 2)
+
+    def test_permission_errors_are_not_retried(self):
+        throttle = self.get_throttle(100)
+        func = Mock(side_effect=GithubException(403, {"message": "Resource not accessible by integration"}))
+
+        with self.assertRaises(GithubException):
+            throttle.call(func)
+
+        self.assertEquals(func.call_count, 1)
+
+    def test_spent_rate_limit_is_retried(self):
+        throttle = self.get_throttle(0)
+        func = Mock(side_effect=[GithubException(403, {"message": "Forbidden"}), "ok"])
+
+        self.assertEquals(throttle.call(func), "ok")
+
+    def test_other_errors_are_not_retried(self):
+        throttle = self.get_throttle(100)
+        func = Mock(side_effect=GithubException(404, "not found"))
+
+        with self.assertRaises(GithubException):
+            throttle.call(func)
+
+        self.assertEquals(func.call_count, 1)
+
+    def test_report_usage_per_window(self):
+        throttle = self.get_throttle(100)
+        throttle.delay()
+        throttle.client.rate_limiting = (60, 5000)
+        throttle.delay()
+
+        self.assertEquals(throttle.report(), [(1000, 40, 5000)])
+
+class CheckRunTestCase(TestCase):
+
+    def get_run(self, **kwargs):
+        with patch("checker.checker.Github"), \
+                patch("checker.checker.get_org_users", return_value=get_org_members()):
+            run = CheckRun(Mock(), sequential=True, **kwargs)
+
+        run.throttle = run.source.throttle = Mock(
+            call=lambda func, *args, **kwargs: func(*args, **kwargs),
+            report=Mock(return_value=[]))
+        return run
+
+    def get_commit(self, sha, files=()):
+        return Mock(sha=sha, raw_data={"files": list(files)}, author=None, html_url="url")
+
+    def get_repo(self, commits, name="test_repo", pushed_at=None):
+        branch = Mock(commit=Mock(sha=commits[0].sha))
+        branch.name = "master"
+
+        repo = Mock(default_branch="master", pushed_at=pushed_at, private=False)
+        repo.name = name
+        repo.get_branches.return_value = [branch]
+        repo.get_commits.return_value = commits
+
+        return repo
+
+    def test_matches_raise_issue_with_line_numbers(self):
+        run = self.get_run()
+        run.keywords = get_matcher(["secret"])
+        commit = self.get_commit("a", [
+            {"filename": "settings.py", "patch": "@@ -0,0 +1,2 @@\n+x = 1\n+secret = 2"}])
+
+        run.check_repository(self.get_repo([commit]))
+
+        issue = Issue.objects.get()
+        self.assertEquals(issue.report, "File: settings.py contains keywords: secret (line 2)")
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a"})
+
+    def test_new_commits_are_marked_and_head_recorded(self):
+        run = self.get_run()
+        repo = self.get_repo([self.get_commit("b"), self.get_commit("a")])
+
+        run.check_repository(repo)
+        run.checkpoint.flush()
+
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a", "b"})
+        self.assertEquals(BranchHead.objects.heads("test_repo"), {"master": "b"})
+
+    def test_branch_that_cannot_be_listed_is_not_recorded(self):
+        run = self.get_run()
+        repo = self.get_repo([self.get_commit("a")], pushed_at=dt.datetime(2017, 1, 1))
+        repo.get_commits.side_effect = IOError("listing failed")
+
+        run.check_repository(repo)
+        run.checkpoint.flush()
+
+        self.assertEquals(BranchHead.objects.heads("test_repo"), {})
+        self.assertEquals(RepositoryPush.objects.pushed_at(), {})
+        self.assertEquals(run.stats["branches that couldn't be listed"], 1)
+
+    def test_scanned_commit_clears_its_failure(self):
+        Failure.objects.create(repository="test_repo", branch="master", commit="a")
+        run = self.get_run()
+
+        run.check_repository(self.get_repo([self.get_commit("a")]))
+
+        self.assertFalse(Failure.objects.exists())
+
+    def test_commits_seen_in_another_repository_are_not_fetched(self):
+        run = self.get_run()
+        shared = self.get_commit("a")
+        run.check_repository(self.get_repo([shared], name="upstream"))
+
+        fork_commit = Mock(sha="a", author=None, html_url="url")
+        type(fork_commit).raw_data = property(lambda c: self.fail("fetched twice"))
+        run.check_repository(self.get_repo([fork_commit], name="fork"))
+        run.checkpoint.flush()
+
+        self.assertEquals(Repository.objects.scanned_commits("fork"), {"a"})
+        self.assertEquals(run.stats["commits already seen this run"], 1)
+        self.assertEquals(run.stats["commits scanned"], 1)
+
+    def test_interrupted_run_resumes_from_cursor(self):
+        run_state = Run.objects.create()
+        RunCursor.objects.create(run=run_state, repository="test_repo", branch="master",
+                                 head="c", commit="b")
+        Repository.objects.create(repository="test_repo", commit="c")
+        Repository.objects.create(repository="test_repo", commit="b")
+
+        run = self.get_run()
+        self.assertEquals(run.run_state, run_state)
+
+        commits = [self.get_commit("d"), self.get_commit("c"), self.get_commit("b"), self.get_commit("a")]
+        repo = self.get_repo(commits)
+        repo.get_commits.side_effect = lambda sha: commits[["d", "c", "b", "a"].index(sha):] \
+            if sha != "master" else commits
+
+        run.check_repository(repo)
+        run.checkpoint.flush()
+
+        # the rest of the interrupted listing, then what was pushed since
+        self.assertEquals(repo.get_commits.call_args_list[0], call(sha="b"))
+        self.assertEquals(repo.get_commits.call_count, 2)
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a", "b", "c", "d"})
+        self.assertEquals(BranchHead.objects.heads("test_repo"), {"master": "d"})
+        self.assertEquals(run_state.completed_repositories(), {"test_repo"})
+        self.assertFalse(RunCursor.objects.exists())
+
+    def test_completed_repositories_are_skipped_when_resuming(self):
+        run = self.get_run()
+        run.checkpoint.set_completed("test_repo")
+        run.checkpoint.flush()
+
+        run = self.get_run()
+        repo = self.get_repo([self.get_commit("a")])
+
+        with patch("checker.checker.get_respositories", return_value=[repo]):
+            run.run()
+
+        self.assertFalse(repo.get_branches.called)
+        self.assertIsNotNone(Run.objects.get().finished)
+
+    def test_repository_leased_by_another_worker_is_skipped(self):
+        RepositoryLease.objects.acquire("test_repo", "other", dt.timedelta(minutes=10))
+        run = self.get_run()
+        repo = self.get_repo([self.get_commit("a")])
+
+        with patch("checker.checker.get_respositories", return_value=[repo]):
+            run.run()
+
+        self.assertFalse(repo.get_branches.called)
+        self.assertEquals(run.stats["repositories leased by another worker"], 1)
+
+    def test_lease_is_released_after_checking(self):
+        run = self.get_run()
+        repo = self.get_repo([self.get_commit("a")])
+
+        with patch("checker.checker.get_respositories", return_value=[repo]):
+            run.run()
+
+        self.assertTrue(repo.get_branches.called)
+        self.assertFalse(RepositoryLease.objects.exists())
+
+    def test_excluded_branch_is_not_listed(self):
+        Exclude.objects.create(repository="test_repo", branch="master")
+        run = self.get_run()
+        repo = self.get_repo([self.get_commit("a")])
+
+        run.check_repository(repo)
+
+        self.assertFalse(repo.get_commits.called)
+        self.assertEquals(run.stats["branches excluded"], 1)
+
+    def test_unchanged_branch_is_not_listed(self):
+        BranchHead.objects.create(repository="test_repo", branch="master", commit="b")
+        run = self.get_run()
+        repo = self.get_repo([self.get_commit("b")])
+
+        run.check_repository(repo)
+
+        self.assertFalse(repo.get_commits.called)
+        self.assertEquals(run.stats["branches unchanged"], 1)
+
+    def get_comparison(self, commits, patches, status="ahead"):
+        return Mock(status=status, commits=commits, total_commits=len(commits),
+                    files=[Mock(filename="settings.py", changes=1, patch=patch)
+                           for patch in patches])
+
+    @override_settings(CHECKER_COMPARE=True)
+    def test_compare_marks_clean_range_without_fetching_commits(self):
+        BranchHead.objects.create(repository="test_repo", branch="master", commit="a")
+        run = self.get_run()
+        run.keywords = get_matcher(["secret"])
+        commits = [self.get_commit("c"), self.get_commit("b")]
+        repo = self.get_repo(commits)
+        repo.compare.return_value = self.get_comparison(commits, ["@@ -1 +1 @@\n+clean\n"])
+
+        run.check_repository(repo)
+        run.checkpoint.flush()
+
+        self.assertFalse(repo.get_commits.called)
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"b", "c"})
+        self.assertEquals(BranchHead.objects.heads("test_repo"), {"master": "c"})
+
+    @override_settings(CHECKER_COMPARE=True)
+    def test_compare_falls_back_to_commits_on_match(self):
+        BranchHead.objects.create(repository="test_repo", branch="master", commit="a")
+        run = self.get_run()
+        run.keywords = get_matcher(["secret"])
+        commits = [self.get_commit("c")]
+        repo = self.get_repo(commits)
+        repo.compare.return_value = self.get_comparison(commits, ["@@ -1 +1 @@\n+ secret \n"])
+
+        run.check_repository(repo)
+
+        self.assertTrue(repo.get_commits.called)
+
+    @override_settings(CHECKER_COMPARE=True)
+    def test_compare_falls_back_to_commits_when_truncated(self):
+        BranchHead.objects.create(repository="test_repo", branch="master", commit="a")
+        run = self.get_run()
+        commits = [self.get_commit("c")]
+        repo = self.get_repo(commits)
+        repo.compare.return_value = self.get_comparison(commits, [None])
+
+        run.check_repository(repo)
+
+        self.assertTrue(repo.get_commits.called)
+        self.assertEquals(run.stats["comparisons truncated"], 1)
+
+    def test_unchanged_repository_is_skipped(self):
+        pushed_at = dt.datetime(2017, 1, 1)
+        RepositoryPush.objects.create(repository="test_repo", pushed_at=pushed_at)
+        run = self.get_run()
+        repo = self.get_repo([self.get_commit("b")], pushed_at=pushed_at)
+
+        run.check_repository(repo)
+
+        self.assertFalse(repo.get_branches.called)
+
+class CheckDaemonTestCase(TestCase):
+
+    def test_pushed_repositories_are_checked_and_rescheduled(self):
+        pushed_at = dt.datetime(2017, 1, 2)
+        RepositoryPush.objects.create(repository="old", pushed_at=pushed_at)
+        old, new = Mock(pushed_at=pushed_at), Mock(pushed_at=pushed_at, private=False)
+        old.name, new.name = "old", "new"
+        daemon = CheckDaemon(Mock())
+
+        with patch("checker.daemon.CheckRun") as check_run, \
+                patch("checker.daemon.get_respositories", return_value=[old, new]):
+            check_run.return_value.pushed_at = RepositoryPush.objects.pushed_at()
+            check_run.return_value.excludes = Exclude.objects.rules()
+            check_run.return_value.throttle.call.return_value = new
+            daemon.start_run()
+
+            self.assertEquals(daemon.scheduler.pop(), "new")
+            self.assertIsNone(daemon.scheduler.pop())
+
+            daemon.poll("new")
+
+        check_run.return_value.check.assert_called_once_with(new)
+        self.assertIn("new", daemon.scheduler)
+
+    def test_failed_fetch_is_retried_by_last_push(self):
+        now = 1000000
+        daemon = CheckDaemon(Mock(), clock=lambda: now)
+        daemon.run = Mock()
+        daemon.pushed_at["busy"] = now - 60
+
+        for error in (GithubException(502, "bad gateway"), SSLError("reset"), IOError("timeout")):
+            daemon.run.throttle.call.side_effect = error
+            daemon.poll("busy")
+
+            self.assertEquals(daemon.scheduler.wait_time(), settings.CHECKER_DAEMON_MIN_INTERVAL)
+
+        daemon.poll("unknown")
+        self.assertIn("unknown", daemon.scheduler)
+
+    def test_commits_pushed_between_polls_are_scanned(self):
+        daemon = CheckDaemon(Mock())
+
+        with patch("checker.checker.Github"), \
+                patch("checker.checker.get_org_users", return_value=get_org_members()):
+            daemon.run = CheckRun(Mock(), sequential=True)
+
+        daemon.run.throttle = daemon.run.source.throttle = Mock(
+            call=lambda func, *args, **kwargs: func(*args, **kwargs))
+
+        branch = Mock()
+        branch.name = "master"
+        repo = Mock(default_branch="master", private=False)
+        repo.name = "test_repo"
+        repo.get_branches.return_value = [branch]
+        daemon.run.client.get_repo.return_value = repo
+
+        commits = [Mock(sha=sha, raw_data={"files": []}, author=None, html_url="url")
+                   for sha in ("b", "a")]
+
+        # two polls within one run, with b pushed in between
+        for pushed_at, listed in ((dt.datetime(2017, 1, 1), commits[1:]), (dt.datetime(2017, 1, 2), commits)):
+            branch.commit.sha = listed[0].sha
+            repo.pushed_at = pushed_at
+            repo.get_commits.return_value = listed
+            daemon.poll("test_repo")
+
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a", "b"})
+        self.assertEquals(BranchHead.objects.heads("test_repo"), {"master": "b"})
+        self.assertFalse(RunCursor.objects.exists())
+
+
+@override_settings(GITHUB_WEBHOOK_SECRET="secret")
+class PushWebhookTestCase(TestCase):
+
+    def post(self, payload, event="push", secret="secret"):
+        body = json.dumps(payload).encode("utf-8")
+        signature = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+        return self.client.post(
+            "/webhook/push/", body, content_type="application/json",
+            HTTP_X_GITHUB_EVENT=event, HTTP_X_HUB_SIGNATURE_256="sha256=" + signature)
+
+    def get_payload(self, ref="refs/heads/master", commits=("a", "b")):
+        return {
+            "ref": ref, "after": commits[-1] if commits else "0" * 40,
+            "repository": {"name": "test_repo", "private": False},
+            "commits": [{"id": sha} for sha in commits],
+        }
+
+    def test_push_commits_are_queued(self):
+        response = self.post(self.get_payload())
+
+        self.assertEquals(response.status_code, 202)
+        self.assertEquals(
+            list(PushedCommit.objects.order_by("id").values_list("branch", "commit")),
+            [("master", "a"), ("master", "b")])
+
+        self.post(self.get_payload(ref="refs/heads/feature", commits=("b", "c")))
+        self.assertEquals(PushedCommit.objects.count(), 3)
+
+    def test_invalid_signature_is_rejected(self):
+        response = self.post(self.get_payload(), secret="wrong")
+
+        self.assertEquals(response.status_code, 403)
+        self.assertFalse(PushedCommit.objects.exists())
+
+    def test_tags_and_other_events_are_ignored(self):
+        self.post(self.get_payload(ref="refs/tags/v1"))
+        self.post(self.get_payload(), event="issues")
+
+        self.assertFalse(PushedCommit.objects.exists())
+        self.assertEquals(self.post({}, event="ping").content, b"pong")
+
+    @override_settings(GITHUB_WEBHOOK_SECRET="")
+    def test_disabled_without_secret(self):
+        self.assertEquals(self.post(self.get_payload(), secret="").status_code, 404)
+
+
+class PushWorkerTestCase(TestCase):
+
+    def test_queued_commits_are_scanned_without_marking(self):
+        Keyword.objects.create(text="secret")
+        Repository.objects.mark_scanned([("test_repo", "a")])
+        PushedCommit.objects.enqueue("test_repo", "master", ["a", "b"])
+        commit = Mock(sha="b", author=None, html_url="url", raw_data={"files": [
+            {"filename": "settings.py", "patch": "@@ -0,0 +1 @@\n+secret = 1"}]})
+
+        with patch("checker.checker.Github"), \
+                patch("checker.pushes.get_org_users", return_value=[]):
+            worker = PushWorker(Mock())
+
+        worker.fetch_commit = Mock(return_value=commit)
+
+        self.assertEquals(worker.scan_batch(), 2)
+        worker.fetch_commit.assert_called_once_with("test_repo", "b")
+        self.assertEquals(Issue.objects.get().commit_hash, "b")
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a"})
+        self.assertEquals(PushedCommit.objects.scanned_commits("test_repo"), {"b"})
+        self.assertFalse(PushedCommit.objects.queued().exists())
+
+    def test_check_scans_commits_of_a_lost_push(self):
+        Repository.objects.mark_scanned([("test_repo", "a")])
+        # b's push never arrived, c's was scanned by the worker
+        PushedCommit.objects.enqueue("test_repo", "master", ["c"])
+        PushedCommit.objects.update(scanned=True)
+
+        commits = [Mock(sha=sha, raw_data={"files": []}, author=None, html_url="url")
+                   for sha in ("c", "b", "a")]
+        type(commits[0]).raw_data = property(lambda c: self.fail("scanned again"))
+        branch = Mock(commit=Mock(sha="c"))
+        branch.name = "master"
+        repo = Mock(default_branch="master", pushed_at=None, private=False)
+        repo.name = "test_repo"
+        repo.get_branches.return_value = [branch]
+        repo.get_commits.return_value = commits
+
+        with patch("checker.checker.Github"), \
+                patch("checker.checker.get_org_users", return_value=get_org_members()):
+            run = CheckRun(Mock(), sequential=True)
+
+        run.throttle = run.source.throttle = Mock(
+            call=lambda func, *args, **kwargs: func(*args, **kwargs))
+        run.check(repo)
+
+        self.assertEquals(Repository.objects.scanned_commits("test_repo"), {"a", "b", "c"})
+        self.assertEquals(run.stats["commits scanned"], 1)
+        self.assertEquals(PushedCommit.objects.delete_marked(), 1)
+
+
+@override_settings(NOTIFY_USER=True, CHECKER_NOTIFY_DELAY=0)
+class NotificationTestCase(TestCase):
+
+    def create_issue(self, email, sha):
+        commit = Mock(sha=sha, html_url="url", author=Mock(login="github-user", email=email))
+
+        return Issue.objects.create_from_commit(
+            commit, "test_repo", [["settings.py", "secret", 1]], get_org_members("github-user"))
+
+    def test_issues_are_queued_not_sent(self):
+        issue = self.create_issue("a@test.com", "a")
+
+        self.assertEquals(len(mail.outbox), 0)
+        self.assertEquals(Notification.objects.get().issue, issue)
+
+    def test_issues_for_one_author_are_sent_as_a_digest(self):
+        self.create_issue("a@test.com", "a")
+        self.create_issue("b@test.com", "b")
+        self.create_issue("a@test.com", "c")
+
+        self.assertEquals(NotificationWorker(Mock()).send_batch(), 2)
+
+        self.assertEquals(len(mail.outbox), 2)
+        digest, single = sorted(mail.outbox, key=lambda m: m.to)
+        self.assertEquals(digest.to, ["a@test.com"])
+        self.assertEquals(digest.subject, settings.NOTIFY_DIGEST_SUBJECT.format(2))
+        self.assertIn("Commit: a", digest.body)
+        self.assertIn("Commit: c", digest.body)
+        self.assertEquals(single.subject, settings.NOTIFY_EMAIL_SUBJECT)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_failed_email_is_retried_later(self):
+        self.create_issue("a@test.com", "a")
+        connection = Mock()
+        connection.send_messages.side_effect = IOError("connection refused")
+
+        self.assertEquals(NotificationWorker(Mock(), connection).send_batch(), 1)
+
+        notification = Notification.objects.get()
+        self.assertEquals(notification.attempts, 1)
+        self.assertIn("connection refused", notification.last_error)
+        self.assertFalse(Notification.objects.due().exists())
+        self.assertEquals(NotificationWorker(Mock(), connection).send_batch(), 0)
+
+    @override_settings(CHECKER_NOTIFY_DELAY=300)
+    def test_held_notifications_are_sent_when_the_scan_finishes(self):
+        self.create_issue("a@test.com", "a")
+
+        send_queued_notifications(Mock(), held=False)
+        self.assertEquals(len(mail.outbox), 0)
+
+        send_queued_notifications(Mock())
+        self.assertEquals(len(mail.outbox), 1)
+        self.assertFalse(Notification.objects.exists())
+
+    @override_settings(CHECKER_NOTIFY_WORKER=True)
+    def test_notifications_are_left_to_the_worker(self):
+        self.create_issue("a@test.com", "a")
+
+        send_queued_notifications(Mock())
+
+        self.assertEquals(len(mail.outbox), 0)
+        self.assertTrue(Notification.objects.exists())
+
+    def test_notification_claimed_by_another_worker_is_not_sent(self):
+        self.create_issue("a@test.com", "a")
+        worker = NotificationWorker(Mock())
+        batch = worker.get_batch()
+
+        self.assertTrue(Notification.objects.get().claim())
+        with patch.object(worker, "get_batch", return_value=batch):
+            worker.send_batch()
+
+        self.assertEquals(len(mail.outbox), 0)
+
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class MirrorTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        self.origin = os.path.join(self.directory, "origin")
+        os.mkdir(self.origin)
+        self.git("init", "--quiet")
+        self.git("symbolic-ref", "HEAD", "refs/heads/master")
+
+    def git(self, *args):
+        return subprocess.check_output(
+            ["git", "-c", "user.name=test", "-c", "user.email=test@test.com"] + list(args),
+            cwd=self.origin).decode("utf-8").strip()
+
+    def commit(self, filename, content):
+        with open(os.path.join(self.origin, filename), "w") as f:
+            f.write(content)
+
+        self.git("add", filename)
+        self.git("commit", "--quiet", "-m", filename)
+        return self.git("rev-parse", "HEAD")
+
+    def test_log_yields_commits_with_patches(self):
+        first = self.commit("settings.py", "password = 1\n")
+        second = self.commit("other.py", "a = 1\nb = 2\n")
+
+        mirror = Mirror(os.path.join(self.directory, "mirror.git"), self.origin)
+        mirror.update()
+
+        self.assertEquals(mirror.branches(), {"master": second})
+
+        commits = list(mirror.log("master"))
+        self.assertEquals([c.sha for c in commits], [second, first])
+        self.assertEquals(commits[0].raw_data["files"], [
+            {"filename": "other.py", "patch": "@@ -0,0 +1,2 @@\n+a = 1\n+b = 2"}])
+        self.assertEquals(commits[1].raw_data["files"], [
+            {"filename": "settings.py", "patch": "@@ -0,0 +1 @@\n+password = 1"}])
+
+    def test_update_fetches_new_commits(self):
+        self.commit("a.txt", "a\n")
+        mirror = Mirror(os.path.join(self.directory, "mirror.git"), self.origin)
+        mirror.update()
+
+        head = self.commit("b.txt", "b\n")
+        mirror.update()
+
+        self.assertEquals(mirror.branches(), {"master": head})
+        self.assertEquals(len(list(mirror.log("master"))), 2)
+
+    def test_failed_log_raises(self):
+        self.commit("a.txt", "a\n")
+        mirror = Mirror(os.path.join(self.directory, "mirror.git"), self.origin)
+        mirror.update()
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            list(mirror.log("refs/heads/missing"))
+
+        # stopping part way through isn't a failure
+        next(mirror.log("master"))
+
 # TODO: integration tests:
 # Test exceptions are logged
 # The case of an exception the last updated date isn't set
\ No newline at end of file
@@ -0,0 +1,127 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from github.GithubException import GithubException
+
+
+# words in the message of a 403 from the secondary (abuse) rate limits
+RATE_LIMIT_MESSAGES = ("rate limit", "abuse")
+
+
+def is_rate_limited(error, client):
+    """
+    Return whether a GithubException is GitHub limiting the rate of requests,
+    rather than refusing them for good (e.g. a missing permission).
+    """
+
+    if error.status not in (403, 429):
+        return False
+
+    # PyGithub only keeps the headers on the exception from 1.43
+    headers = dict((k.lower(), v) for k, v in (getattr(error, "headers", None) or {}).items())
+
+    if "retry-after" in headers:
+        return True
+
+    remaining = headers.get("x-ratelimit-remaining")
+
+    if remaining is None:
+        remaining = client.rate_limiting[0]
+
+    if int(remaining) == 0:
+        return True
+
+    message = error.data.get("message", "") if isinstance(error.data, dict) else error.data
+
+    return any(text in (message or "").lower() for text in RATE_LIMIT_MESSAGES)
+
+
+class Throttle(object):
+    """
+    Spread GitHub API calls evenly over what is left of the rate limit window.
+
+    PyGithub keeps the X-RateLimit-Remaining / X-RateLimit-Reset values of the
+    last response on the client, so before each call we work out how long to
+    wait for the remaining budget (less a reserve for anything else using the
+    token) to last until the reset time.  A 403 from the rate limit or abuse
+    detection backs off exponentially before the call is retried, any other
+    403 is raised straight away.
+    """
+
+    def __init__(self, client, min_interval=0, reserve=0, backoff=5,
+                 max_backoff=900, max_retries=5, clock=time.time, sleep=time.sleep):
+        self.client = client
+        self.min_interval = min_interval
+        self.reserve = reserve
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sleep = sleep
+
+        self.windows = OrderedDict()
+        self._next_call = 0
+        self._lock = threading.Lock()
+
+    def _observe(self):
+        remaining, limit = self.client.rate_limiting
+        reset = self.client.rate_limiting_resettime
+
+        window = self.windows.setdefault(
+            reset, dict(limit=limit, start=remaining, remaining=remaining))
+        window["remaining"] = min(window["remaining"], remaining)
+
+        return remaining, reset
+
+    def delay(self):
+        """
+        Return how long the next call should wait, and reserve its slot.
+        """
+
+        with self._lock:
+            remaining, reset = self._observe()
+            now = self.clock()
+            budget = remaining - self.reserve
+
+            if budget <= 0:
+                # nothing left to spend, wait for the window to reset
+                start = max(reset, now)
+            else:
+                interval = max(float(reset - now) / budget, self.min_interval)
+                start = max(self._next_call, now)
+                self._next_call = start + interval
+
+            return max(start - now, 0)
+
+    def wait(self):
+        self.sleep(self.delay())
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func once the budget allows, retrying with exponential backoff
+        and jitter if GitHub limits the rate of requests.
+        """
+
+        for attempt in range(self.max_retries + 1):
+            self.wait()
+
+            try:
+                return func(*args, **kwargs)
+            except GithubException as e:
+                if attempt == self.max_retries or not is_rate_limited(e, self.client):
+                    raise
+
+                self.sleep(min(self.backoff * 2 ** attempt, self.max_backoff)
+                           * random.uniform(1, 1.5))
+
+    def report(self):
+        """
+        Return (reset time, requests used, limit) for each window seen.
+        """
+
+        return [
+            (reset, window["start"] - window["remaining"], window["limit"])
+            for reset, window in self.windows.items()
+        ]
@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from  django.views.generic.base import TemplateView
+import json
+
+from  django.views.generic.base import TemplateView, View
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.contrib import messages
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
 
 from .models import Issue
+from .pushes import enqueue_push, verify_signature
 
 
 class AuthorResponseView(TemplateView):
@@ -31,3 +38,38 @@ class AuthorResponseView(TemplateView):
             uuid=self.kwargs["uuid"])
 
         return context
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class PushWebhookView(View):
+    """
+    Receive the organisation's webhook events, queueing the commits of each
+    push for the scan_pushes worker.
+    """
+
+    def post(self, request, *args, **kwargs):
+        if not settings.GITHUB_WEBHOOK_SECRET:
+            raise Http404
+
+        if not verify_signature(settings.GITHUB_WEBHOOK_SECRET, request.body, request.META):
+            return HttpResponseForbidden("Invalid signature")
+
+        event = request.META.get("HTTP_X_GITHUB_EVENT")
+
+        if event == "ping":
+            return HttpResponse("pong")
+
+        if event != "push":
+            return HttpResponse(status=204)
+
+        try:
+            if request.content_type == "application/x-www-form-urlencoded":
+                payload = json.loads(request.POST["payload"])
+            else:
+                payload = json.loads(request.body.decode("utf-8"))
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest("Invalid payload")
+
+        queued = enqueue_push(payload)
+
+        return HttpResponse("Queued {} commits".format(queued), status=202)
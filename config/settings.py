@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import socket
 import sys
 
 import dj_database_url
@@ -141,7 +142,106 @@ EMAIL_USE_TLS = 1
 
 GITHUB_ACCESS_TOKEN = os.environ.get("GITHUB_ACCESS_TOKEN", "")
 GITHUB_ORGANISATION = os.environ.get("GITHUB_ORGANISATION", "uktrade")
-GITHUB_QUERY_SLEEP_TIME = float(os.environ.get("GITHUB_QUERY_SLEEP_TIME", 1))
+# Minimum time between commit fetches; the throttle otherwise spreads the remaining
+# rate limit evenly up to its reset time, keeping GITHUB_RATE_LIMIT_RESERVE requests spare
+GITHUB_QUERY_SLEEP_TIME = float(os.environ.get("GITHUB_QUERY_SLEEP_TIME", 0))
+GITHUB_RATE_LIMIT_RESERVE = int(os.environ.get("GITHUB_RATE_LIMIT_RESERVE", 100))
+# Set CHECKER_DISCOVERY to "graphql" to list repositories with their branches and head
+# commits in batched GraphQL queries instead of REST requests for each repository
+CHECKER_DISCOVERY = os.environ.get("CHECKER_DISCOVERY", "rest")
+# Organisation repo and member lists, repositories and branch lists are requested with the
+# ETag of the last response, up to CHECKER_HTTP_CACHE_ENTRIES kept in memory or up to
+# CHECKER_HTTP_CACHE_BYTES in an SQLite file at CHECKER_HTTP_CACHE_PATH, which every worker
+# can share, so unchanged ones don't count against the rate limit
+CHECKER_HTTP_CACHE_ENTRIES = int(os.environ.get("CHECKER_HTTP_CACHE_ENTRIES", 1000))
+CHECKER_HTTP_CACHE_PATH = os.environ.get("CHECKER_HTTP_CACHE_PATH")
+CHECKER_HTTP_CACHE_BYTES = int(os.environ.get("CHECKER_HTTP_CACHE_BYTES", 256 * 1024 * 1024))
+# The organisation's members are kept in the database and checked for changes (with
+# conditional requests) once they are CHECKER_ORG_MEMBERS_TTL seconds old
+CHECKER_ORG_MEMBERS_TTL = int(os.environ.get("CHECKER_ORG_MEMBERS_TTL", 3600))
+# Secret of the organisation's push webhook (sent to /webhook/push/), the endpoint is disabled
+# without one.  The scan_pushes worker checks the queue every CHECKER_PUSH_POLL_INTERVAL seconds
+GITHUB_WEBHOOK_SECRET = os.environ.get("GITHUB_WEBHOOK_SECRET", "")
+CHECKER_PUSH_POLL_INTERVAL = float(os.environ.get("CHECKER_PUSH_POLL_INTERVAL", 5))
+CHECKER_PUSH_BATCH_SIZE = int(os.environ.get("CHECKER_PUSH_BATCH_SIZE", 100))
+CHECKER_PIPELINE = os.environ.get("CHECKER_PIPELINE", "True") == "True"
+CHECKER_FETCH_WORKERS = int(os.environ.get("CHECKER_FETCH_WORKERS", 4))
+CHECKER_QUEUE_SIZE = int(os.environ.get("CHECKER_QUEUE_SIZE", 32))
+# An unfinished run started less than CHECKER_RESUME_HOURS ago is carried on from where it
+# stopped, rather than starting again from the first repository
+CHECKER_RESUME_HOURS = float(os.environ.get("CHECKER_RESUME_HOURS", 24))
+# Commits that failed to scan are retried by manage.py retry_failures, waiting
+# CHECKER_RETRY_BACKOFF seconds, doubling each attempt up to CHECKER_RETRY_MAX_BACKOFF,
+# and given up on after CHECKER_RETRY_MAX_ATTEMPTS
+CHECKER_RETRY_BACKOFF = float(os.environ.get("CHECKER_RETRY_BACKOFF", 300))
+CHECKER_RETRY_MAX_BACKOFF = float(os.environ.get("CHECKER_RETRY_MAX_BACKOFF", 24 * 60 * 60))
+CHECKER_RETRY_MAX_ATTEMPTS = int(os.environ.get("CHECKER_RETRY_MAX_ATTEMPTS", 10))
+# Workers hold a lease on the repository they are checking so several run_check workers
+# (e.g. run_check --shard i/N) never check the same one; a crashed worker's leases expire
+# after CHECKER_LEASE_SECONDS, or are taken straight back by a worker with the same id
+CHECKER_WORKER_ID = os.environ.get(
+    "CHECKER_WORKER_ID", "{}:{}".format(socket.gethostname(), os.getpid()))
+CHECKER_LEASE_SECONDS = int(os.environ.get("CHECKER_LEASE_SECONDS", 600))
+# run_checker_daemon lists the organisation every CHECKER_DAEMON_LIST_INTERVAL seconds and
+# polls each repository after CHECKER_DAEMON_AGE_FACTOR of the time since its last push,
+# between CHECKER_DAEMON_MIN_INTERVAL and CHECKER_DAEMON_MAX_INTERVAL seconds
+CHECKER_DAEMON_LIST_INTERVAL = int(os.environ.get("CHECKER_DAEMON_LIST_INTERVAL", 3600))
+CHECKER_DAEMON_MIN_INTERVAL = int(os.environ.get("CHECKER_DAEMON_MIN_INTERVAL", 300))
+CHECKER_DAEMON_MAX_INTERVAL = int(os.environ.get("CHECKER_DAEMON_MAX_INTERVAL", 86400))
+CHECKER_DAEMON_AGE_FACTOR = float(os.environ.get("CHECKER_DAEMON_AGE_FACTOR", 0.1))
+# Scanned commit markers are written in batches of CHECKER_CHECKPOINT_SIZE, or after
+# CHECKER_CHECKPOINT_INTERVAL seconds, whichever comes first
+CHECKER_CHECKPOINT_SIZE = int(os.environ.get("CHECKER_CHECKPOINT_SIZE", 500))
+CHECKER_CHECKPOINT_INTERVAL = float(os.environ.get("CHECKER_CHECKPOINT_INTERVAL", 30))
+# Check new commits on a branch with one compare call first, only fetching them one at a
+# time if the combined diff has a match.  Keywords added and removed again between two
+# runs don't show up in a combined diff, so this trades some coverage for API calls.
+CHECKER_COMPARE = os.environ.get("CHECKER_COMPARE", "False") == "True"
+# Number of worker processes used to scan patches (0 scans in the main process), and the
+# number of characters of patch handed to a worker at a time
+CHECKER_SCAN_PROCESSES = int(os.environ.get("CHECKER_SCAN_PROCESSES", 0))
+CHECKER_SCAN_CHUNK_SIZE = int(os.environ.get("CHECKER_SCAN_CHUNK_SIZE", 1024 * 1024))
+# Scan results are cached by patch contents and keyword set, up to CHECKER_SCAN_CACHE_BYTES
+# in memory and optionally CHECKER_SCAN_CACHE_DISK_BYTES in an SQLite file at
+# CHECKER_SCAN_CACHE_PATH, which every worker can share
+CHECKER_SCAN_CACHE_BYTES = int(os.environ.get("CHECKER_SCAN_CACHE_BYTES", 16 * 1024 * 1024))
+CHECKER_SCAN_CACHE_PATH = os.environ.get("CHECKER_SCAN_CACHE_PATH")
+CHECKER_SCAN_CACHE_DISK_BYTES = int(os.environ.get("CHECKER_SCAN_CACHE_DISK_BYTES", 256 * 1024 * 1024))
+# Files GitHub reports more than CHECKER_MAX_FILE_CHANGES changed lines for, or with a patch
+# longer than CHECKER_MAX_PATCH_SIZE characters, are not scanned (0, the default, for no
+# limit, since anything skipped is never checked for keywords), along with the paths
+# excluded by the path filters in the admin
+CHECKER_MAX_FILE_CHANGES = int(os.environ.get("CHECKER_MAX_FILE_CHANGES", 0))
+CHECKER_MAX_PATCH_SIZE = int(os.environ.get("CHECKER_MAX_PATCH_SIZE", 0))
+# Files GitHub lists without a patch (too big a diff) have their whole content streamed in
+# CHECKER_BLOB_CHUNK_SIZE byte chunks, scanning pieces of long lines overlapping by
+# CHECKER_BLOB_OVERLAP characters, up to CHECKER_MAX_BLOB_SIZE bytes of each file
+CHECKER_SCAN_BLOBS = os.environ.get("CHECKER_SCAN_BLOBS", "True") == "True"
+CHECKER_BLOB_CHUNK_SIZE = int(os.environ.get("CHECKER_BLOB_CHUNK_SIZE", 64 * 1024))
+CHECKER_BLOB_OVERLAP = int(os.environ.get("CHECKER_BLOB_OVERLAP", 1024))
+CHECKER_MAX_BLOB_SIZE = int(os.environ.get("CHECKER_MAX_BLOB_SIZE", 50 * 1024 * 1024))
+# Scanned patches are kept compressed in CHECKER_PATCH_STORE_DIR, if set, so that
+# manage.py rescan_keywords can scan history for new keywords without fetching it again
+CHECKER_PATCH_STORE_DIR = os.environ.get("CHECKER_PATCH_STORE_DIR")
+CHECKER_PATCH_STORE_SEGMENT_SIZE = int(os.environ.get("CHECKER_PATCH_STORE_SEGMENT_SIZE", 64 * 1024 * 1024))
+# Where commits are read from: "api", or "mirror" to scan bare clones kept in
+# CHECKER_MIRROR_DIR, which leaves only repository listing and issue details to the API
+CHECKER_SOURCE = os.environ.get("CHECKER_SOURCE", "api")
+CHECKER_MIRROR_DIR = os.environ.get("CHECKER_MIRROR_DIR", os.path.join(BASE_DIR, "mirrors"))
 NOTIFY_USER = os.environ.get("NOTIFY_USER", "False") == "True"
 NOTIFY_EMAIL_SUBJECT = "[DIT-github-checker] Please review your github commit"
 NOTIFY_EMAIL_FROM = os.environ.get("NOTIFY_EMAIL_FROM", "no-reply@email.com")
+NOTIFY_DIGEST_SUBJECT = "[DIT-github-checker] Please review your {} github commits"
+# Notifications are queued, held for CHECKER_NOTIFY_DELAY seconds so an author's issues
+# from one scan go in one digest, and sent up to CHECKER_NOTIFY_BATCH_SIZE emails per SMTP
+# connection.  Failed emails are retried after CHECKER_NOTIFY_RETRY_BACKOFF seconds,
+# doubling each attempt up to CHECKER_RETRY_MAX_BACKOFF, and given up on after
+# CHECKER_NOTIFY_MAX_ATTEMPTS.  They are sent when run_check, retry_failures and
+# rescan_keywords finish and as the daemon and push worker go, unless CHECKER_NOTIFY_WORKER
+# is True and a manage.py send_notifications process is run to send them instead
+CHECKER_NOTIFY_WORKER = os.environ.get("CHECKER_NOTIFY_WORKER", "False") == "True"
+CHECKER_NOTIFY_DELAY = int(os.environ.get("CHECKER_NOTIFY_DELAY", 300))
+CHECKER_NOTIFY_BATCH_SIZE = int(os.environ.get("CHECKER_NOTIFY_BATCH_SIZE", 50))
+CHECKER_NOTIFY_POLL_INTERVAL = float(os.environ.get("CHECKER_NOTIFY_POLL_INTERVAL", 30))
+CHECKER_NOTIFY_RETRY_BACKOFF = float(os.environ.get("CHECKER_NOTIFY_RETRY_BACKOFF", 60))
+CHECKER_NOTIFY_MAX_ATTEMPTS = int(os.environ.get("CHECKER_NOTIFY_MAX_ATTEMPTS", 10))